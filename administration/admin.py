@@ -1,16 +1,25 @@
+from collections import defaultdict
+
 from django.contrib import admin
 from django.contrib import messages
+from django.contrib.admin import helpers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
+from django.core.paginator import Paginator
 from django.db.models import ForeignKey
+from django.http import JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
 from django.urls import path, reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from .enums import Status
-from .forms import StudentImportForm, GroupImportForm
+from .enums import ImportKind, Status
+from .exports import export_response, roster_rows, transfer_rows
+from .forms import SettingsForm, StudentImportForm, GroupImportForm
+from .grouping import create_subject_groups_for_groups, generate_subject_groups
+from .imports import IMPORTERS, start_import_job
+from .matching import match_subject
 from .models import (
     Settings,
     Faculty,
@@ -21,13 +30,18 @@ from .models import (
     Subject,
     SubjectGroup,
     TransferRequest,
-    FieldChangeLog
+    ChangeLog,
+    ImportJob,
+    complete_requests
 )
 from .staff import StaffProfile
 
 User = get_user_model()
 admin.site.unregister(User)
 
+# Строк diff на странице предпросмотра импорта
+PREVIEW_PAGE_SIZE = 100
+
 
 class StaffProfileInline(admin.StackedInline):
     model = StaffProfile
@@ -50,6 +64,23 @@ class UserAdmin(DjangoUserAdmin):
 @admin.register(Settings)
 class SettingsAdmin(admin.ModelAdmin):
     list_display = ('default_min_students', 'default_max_students', 'default_deadline')
+    form = SettingsForm
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+
+        if change and form.cleaned_data.get('apply_to_groups'):
+            updated = SubjectGroup.apply_default_capacity(
+                form.initial['default_min_students'],
+                form.initial['default_max_students'],
+                obj.default_min_students,
+                obj.default_max_students
+            )
+            self.message_user(
+                request,
+                _('Значения по умолчанию применены к предметным группам: %(count)d') % {'count': updated},
+                level=messages.SUCCESS
+            )
 
     def has_add_permission(self, request):
         return False
@@ -81,6 +112,8 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('education_system', 'archive')
     search_fields = ('name', 'code', 'faculty__name', 'department__name')
 
+    actions = ['make_subjectgroups']
+
     change_list_template = 'administration/group_changelist.html'
     change_form_template = 'administration/group_change_form.html'
 
@@ -105,21 +138,14 @@ class GroupAdmin(admin.ModelAdmin):
             form = GroupImportForm(request.POST, request.FILES)
 
             if form.is_valid():
-                ods_file = form.cleaned_data['file']
+                job = ImportJob.objects.create(
+                    kind=ImportKind.groups,
+                    file=form.cleaned_data['file'],
+                    dry_run=form.cleaned_data['dry_run']
+                )
+                start_import_job(job)
 
-                try:
-                    created, updated, skipped = GroupImportForm.parse_and_save_groups_from_ods(ods_file)
-
-                    self.message_user(
-                        request,
-                        f'Импорт групп завершён: создано {created}, обновлено {updated}, пропущено {skipped}',
-                        level=messages.SUCCESS
-                    )
-
-                except Exception as e:
-                    self.message_user(request, f'Ошибка: {e}', level=messages.ERROR)
-
-                return redirect('..')
+                return redirect('admin:administration_importjob_progress', job.pk)
 
         else:
             form = GroupImportForm()
@@ -139,7 +165,7 @@ class GroupAdmin(admin.ModelAdmin):
             subject_id = request.POST.get('subject')
             subject = Subject.objects.get(pk=subject_id)
 
-            sg = SubjectGroup.objects.create(subject=subject)
+            sg = SubjectGroup.objects.create(subject=subject, group=group_obj)
             students = group_obj.students.all()
             sg.students.set(students)
 
@@ -162,6 +188,35 @@ class GroupAdmin(admin.ModelAdmin):
         }
         return render(request, 'administration/group_make_subjectgroup.html', context)
 
+    @admin.action(description=_('Создать предметные группы из выбранных учебных групп'))
+    def make_subjectgroups(self, request, queryset):
+        # Промежуточная страница: выбор предметов, затем повторный POST того же действия с apply
+        if 'apply' in request.POST:
+            subjects = list(Subject.objects.filter(pk__in=request.POST.getlist('subjects')))
+
+            if not subjects:
+                self.message_user(request, _('Не выбран ни один предмет'), level=messages.ERROR)
+            else:
+                created, existing, students = create_subject_groups_for_groups(list(queryset), subjects)
+                self.message_user(
+                    request,
+                    _('Создано предметных групп: %(created)d, студентов в них: %(students)d, '
+                      'уже существовали: %(existing)d') % {
+                        'created': len(created), 'students': students, 'existing': existing
+                    },
+                    level=messages.SUCCESS
+                )
+                return None
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'groups': queryset,
+            'subjects': Subject.objects.select_related('faculty', 'department'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return render(request, 'administration/group_make_subjectgroups.html', context)
+
 
 @admin.register(Student)
 class StudentAdmin(admin.ModelAdmin):
@@ -195,21 +250,14 @@ class StudentAdmin(admin.ModelAdmin):
             form = StudentImportForm(request.POST, request.FILES)
 
             if form.is_valid():
-                ods_file = form.cleaned_data['file']
-
-                try:
-                    created, updated, skipped = StudentImportForm.parse_and_save_students_from_ods(ods_file)
-
-                    self.message_user(
-                        request,
-                        f'Импорт студентов: создано {created}, обновлено {updated}, пропущено {skipped}',
-                        level=messages.SUCCESS
-                    )
+                job = ImportJob.objects.create(
+                    kind=ImportKind.students,
+                    file=form.cleaned_data['file'],
+                    dry_run=form.cleaned_data['dry_run']
+                )
+                start_import_job(job)
 
-                except Exception as e:
-                    self.message_user(request, f'Ошибка: {e}', level=messages.ERROR)
-
-                return redirect('..')
+                return redirect('admin:administration_importjob_progress', job.pk)
 
         else:
             form = StudentImportForm()
@@ -233,6 +281,8 @@ class TeacherAdmin(admin.ModelAdmin):
 class SubjectAdmin(admin.ModelAdmin):
     list_display = ('name', 'department', 'faculty', 'course', 'semester', 'year')
     search_fields = ('name', 'department__name', 'faculty__name', 'course', 'year')
+    list_filter = ('year', 'semester')
+    actions = ['match_requests', 'make_subject_groups']
 
     change_form_template = 'administration/subjectgroup_change_form.html'
 
@@ -255,8 +305,11 @@ class SubjectAdmin(admin.ModelAdmin):
         if missing:
             messages.warning(request, f'Не указаны: {', '.join(missing)}')
         else:
-            subject.create_subject_groups()
-            messages.success(request, 'Предметные группы успешно сформированы')
+            created, added = subject.create_subject_groups()
+            messages.success(
+                request,
+                f'Предметные группы сформированы: создано групп {created}, добавлено студентов {added}'
+            )
 
         return redirect(
             reverse('admin:%s_%s_change' % (
@@ -265,21 +318,87 @@ class SubjectAdmin(admin.ModelAdmin):
             ), args=[object_id])
         )
 
+    @admin.action(description=_('Выполнить обмены по заявкам в очереди'))
+    def match_requests(self, request, queryset):
+        exchanges = moved = 0
+
+        for subject in queryset:
+            found = match_subject(subject, modified_by=request.user)
+            exchanges += len(found)
+            moved += sum(len(exchange) for exchange in found)
+
+        self.message_user(
+            request,
+            _('Выполнено обменов: %(exchanges)d, переведено студентов: %(moved)d') % {
+                'exchanges': exchanges, 'moved': moved
+            },
+            level=messages.SUCCESS
+        )
+
+    @admin.action(description=_('Сформировать предметные группы'))
+    def make_subject_groups(self, request, queryset):
+        subjects = list(queryset.select_related('faculty', 'department'))
+        skipped = [subject for subject in subjects if subject.faculty_id is None]
+        subjects = [subject for subject in subjects if subject.faculty_id is not None]
+
+        results = generate_subject_groups(subjects)
+
+        slowest = max(subjects, key=lambda subject: results[subject.pk]['seconds'], default=None)
+        self.message_user(
+            request,
+            _('Предметов: %(subjects)d, создано групп: %(created)d, добавлено студентов: %(added)d') % {
+                'subjects': len(subjects),
+                'created': sum(result['created'] for result in results.values()),
+                'added': sum(result['added'] for result in results.values()),
+            } + (
+                _('; дольше всего считался «%(subject)s»: %(ms).1f мс') % {
+                    'subject': slowest, 'ms': results[slowest.pk]['seconds'] * 1000
+                } if slowest else ''
+            ),
+            level=messages.SUCCESS
+        )
+        if skipped:
+            self.message_user(
+                request,
+                _('Не указан факультет, пропущены: %(subjects)s') % {
+                    'subjects': ', '.join(str(subject) for subject in skipped)
+                },
+                level=messages.WARNING
+            )
+
 
 @admin.register(SubjectGroup)
 class SubjectGroupAdmin(admin.ModelAdmin):
-    list_display = ('subject', 'get_teachers', 'students_count')
+    list_display = ('subject', 'group', 'get_teachers', 'students_count')
     search_fields = ('subject__name', 'teachers__full_name')
     filter_horizontal = ('teachers', 'students')
 
+    change_list_template = 'administration/subjectgroup_changelist.html'
+
     def get_teachers(self, obj):
         return ', '.join([t.full_name for t in obj.teachers.all()])
 
-    def students_count(self, obj):
-        return obj.students.count()
-
     get_teachers.short_description = 'Преподаватели'
-    students_count.short_description = 'Число студентов'
+
+    def get_urls(self):
+        custom_urls = [
+            path(
+                'export/<str:fmt>/',
+                self.admin_site.admin_view(self.export_view),
+                name='administration_subjectgroup_export',
+            ),
+        ]
+        return custom_urls + super().get_urls()
+
+    def export_view(self, request, fmt):
+        # ?faculty=<pk>, ?subject=<pk>
+        queryset = self.get_queryset(request)
+        if request.GET.get('faculty'):
+            queryset = queryset.filter(subject__faculty_id=request.GET['faculty'])
+        if request.GET.get('subject'):
+            queryset = queryset.filter(subject_id=request.GET['subject'])
+
+        return export_response(roster_rows(queryset), fmt, 'subject-groups')
 
 
 @admin.register(TransferRequest)
@@ -290,6 +409,7 @@ class TransferRequestAdmin(admin.ModelAdmin):
     search_fields = ('student__full_name', 'subject__name')
     actions = ['approve_requests']
 
+    change_list_template = 'administration/transferrequest_changelist.html'
     change_form_template = 'administration/transferrequest_change_form.html'
 
     def get_queryset(self, request):
@@ -317,77 +437,116 @@ class TransferRequestAdmin(admin.ModelAdmin):
         obj._modified_by = request.user
         super().save_model(request, obj, form, change)
 
-    def change_view(self, request, object_id, form_url='', extra_context=None):
+    @cached_property
+    def history_fields(self):
+        # Поля заявки по attname и по имени, как они записаны в истории
+        fields = {}
+        for f in TransferRequest._meta.get_fields():
+            if getattr(f, 'attname', None):
+                fields.setdefault(f.attname, f)
+        for f in TransferRequest._meta.get_fields():
+            fields.setdefault(f.name, f)
+        return fields
+
+    @staticmethod
+    def get_history_queryset(model):
+        # Связанные объекты выводятся через __str__, подгружаем то, что ему нужно
+        if model is SubjectGroup:
+            return SubjectGroup.objects.select_related('subject').prefetch_related('teachers')
+        if model is Subject:
+            return Subject.objects.select_related('department', 'faculty')
+        return model.objects.all()
+
+    def build_history(self, logs):
         EMPTY_FIELD_STRING = ' '
 
-        extra_context = extra_context or {}
+        def to_pk(value):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
 
-        tr = get_object_or_404(TransferRequest, pk=object_id)
-        ct = ContentType.objects.get_for_model(TransferRequest)
-        logs = FieldChangeLog.objects.filter(
-            content_type=ct,
-            object_id=tr.pk
-        ).order_by('-timestamp')
+        # Все упомянутые в истории связанные объекты загружаются одним in_bulk на модель
+        related_pks = defaultdict(set)
+        for log in logs:
+            for name, (old_value, new_value) in log.changes.items():
+                field = self.history_fields.get(name)
+                if isinstance(field, ForeignKey) and old_value:
+                    related_pks[field.remote_field.model].update(
+                        pk for pk in (to_pk(old_value), to_pk(new_value)) if pk is not None
+                    )
+
+        related = {
+            model: self.get_history_queryset(model).in_bulk(pks)
+            for model, pks in related_pks.items()
+        }
 
         entries = []
         for log in logs:
-            name = log.field_name
-
-            field = None
-            for f in TransferRequest._meta.get_fields():
-                if getattr(f, 'attname', None) == name:
-                    field = f
-                    break
-
-            if not field:
-                for f in TransferRequest._meta.get_fields():
-                    if f.name == name:
-                        field = f
-                        break
-
-            if isinstance(field, ForeignKey) and field and log.old_value:
-                rel_model = field.remote_field.model
-                old_obj = rel_model.objects.filter(pk=log.old_value).first() if log.old_value else None
-                new_obj = rel_model.objects.filter(pk=log.new_value).first() if log.new_value else None
-                old = str(old_obj) if old_obj else _(EMPTY_FIELD_STRING)
-                new = str(new_obj) if new_obj else _(EMPTY_FIELD_STRING)
-            elif name == 'status':
-                old = Status(log.old_value).label if log.old_value else _(EMPTY_FIELD_STRING)
-                new = Status(log.new_value).label if log.new_value else _(EMPTY_FIELD_STRING)
-            else:
-                old = log.old_value if log.old_value not in (None, 'None', '') else _(EMPTY_FIELD_STRING)
-                new = log.new_value if log.new_value not in (None, 'None', '') else _(EMPTY_FIELD_STRING)
-
             by = ''
             if log.modified_by:
                 by = log.modified_by.get_full_name() if log.modified_by.get_full_name() else log.modified_by.username
 
-            entries.append({
-                'timestamp': log.timestamp,
-                'label': str(field.verbose_name).capitalize() if field else name,
-                'old': old,
-                'new': new,
-                'modified_by': by,
-            })
+            for name, (old_value, new_value) in log.changes.items():
+                field = self.history_fields.get(name)
+
+                if isinstance(field, ForeignKey) and old_value:
+                    objects = related[field.remote_field.model]
+                    old_obj = objects.get(to_pk(old_value))
+                    new_obj = objects.get(to_pk(new_value))
+                    old = str(old_obj) if old_obj else _(EMPTY_FIELD_STRING)
+                    new = str(new_obj) if new_obj else _(EMPTY_FIELD_STRING)
+                elif name == 'status':
+                    old = Status(old_value).label if old_value else _(EMPTY_FIELD_STRING)
+                    new = Status(new_value).label if new_value else _(EMPTY_FIELD_STRING)
+                else:
+                    old = old_value if old_value not in (None, 'None', '') else _(EMPTY_FIELD_STRING)
+                    new = new_value if new_value not in (None, 'None', '') else _(EMPTY_FIELD_STRING)
+
+                entries.append({
+                    'timestamp': log.timestamp,
+                    'label': str(field.verbose_name).capitalize() if field else name,
+                    'old': old,
+                    'new': new,
+                    'modified_by': by,
+                })
+
+        return entries
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        extra_context = extra_context or {}
+
+        tr = get_object_or_404(TransferRequest, pk=object_id)
+        ct = ContentType.objects.get_for_model(TransferRequest)
+        logs = ChangeLog.objects.filter(
+            content_type=ct,
+            object_id=tr.pk
+        ).prefetch_related('modified_by').order_by('-timestamp')
 
-        extra_context['field_logs'] = entries
+        extra_context['field_logs'] = self.build_history(list(logs))
         return super().change_view(request, object_id, form_url, extra_context=extra_context)
 
     @admin.action(description=_('Одобрить выделенные заявки'))
     def approve_requests(self, request, queryset):
-        count = 0
-
-        with transaction.atomic():
-            for req in queryset:
-                req.complete()
-                count += 1
+        completed, failures = complete_requests(queryset, modified_by=request.user)
 
         self.message_user(
             request,
-            _('Одобрено заявок: %(count)d') % {'count': count},
+            _('Одобрено заявок: %(count)d') % {'count': len(completed)},
             level=messages.SUCCESS
         )
 
+        codes_by_reason = defaultdict(list)
+        for req, reason in failures:
+            codes_by_reason[reason].append(req.code)
+
+        for reason, codes in codes_by_reason.items():
+            self.message_user(
+                request,
+                _('Не одобрены заявки (%(reason)s): %(codes)s') % {'reason': reason, 'codes': ', '.join(codes)},
+                level=messages.WARNING
+            )
+
     def get_urls(self):
         custom_urls = [
             path(
@@ -404,10 +563,24 @@ class TransferRequestAdmin(admin.ModelAdmin):
                 '<int:object_id>/undo/',
                 self.admin_site.admin_view(self.undo),
                 name='administration_transferrequest_undo',
-            )
+            ),
+            path(
+                'export/<str:fmt>/',
+                self.admin_site.admin_view(self.export_view),
+                name='administration_transferrequest_export',
+            ),
         ]
         return custom_urls + super().get_urls()
 
+    def export_view(self, request, fmt):
+        # ?status=completed&status=pending (по умолчанию оба), ?faculty=<pk>
+        queryset = self.get_queryset(request)
+        if request.GET.get('faculty'):
+            queryset = queryset.filter(subject__faculty_id=request.GET['faculty'])
+
+        statuses = request.GET.getlist('status') or [Status.COMPLETED, Status.PENDING]
+        return export_response(transfer_rows(queryset, statuses), fmt, 'transfers')
+
     def approve(self, request, object_id):
         transfer_request = self.get_object(request, object_id)
 
@@ -479,3 +652,124 @@ class TransferRequestAdmin(admin.ModelAdmin):
                 transfer_request._meta.model_name,
             ), args=[object_id])
         )
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'status', 'rows_processed', 'rows_per_second', 'created', 'updated', 'skipped',
+                    'created_at', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'file', 'dry_run', 'remove_memberships', 'status', 'rows_processed',
+                       'rows_per_second', 'created', 'updated', 'skipped', 'errors', 'created_at', 'started_at',
+                       'progress_at', 'finished_at')
+    exclude = ('diff',)
+
+    @admin.display(description=_('Строк в секунду'))
+    def rows_per_second(self, obj):
+        return obj.rows_per_second
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        custom_urls = [
+            path(
+                '<int:object_id>/progress/',
+                self.admin_site.admin_view(self.progress_view),
+                name='administration_importjob_progress'
+            ),
+            path(
+                '<int:object_id>/progress.json',
+                self.admin_site.admin_view(self.progress_json),
+                name='administration_importjob_progress_json'
+            ),
+            path(
+                '<int:object_id>/preview/',
+                self.admin_site.admin_view(self.preview_view),
+                name='administration_importjob_preview'
+            ),
+            path(
+                '<int:object_id>/apply/',
+                self.admin_site.admin_view(self.apply_view),
+                name='administration_importjob_apply'
+            ),
+        ]
+
+        return custom_urls + super().get_urls()
+
+    @staticmethod
+    def get_progress(job):
+        return {
+            'status': job.status,
+            'status_display': job.get_status_display(),
+            'finished': job.is_finished,
+            'rows_processed': job.rows_processed,
+            'rows_per_second': job.rows_per_second,
+            'created': job.created,
+            'updated': job.updated,
+            'skipped': job.skipped,
+            'errors': job.errors,
+            'preview_url': (
+                reverse('admin:administration_importjob_preview', args=[job.pk])
+                if job.is_finished and job.diff is not None else None
+            ),
+        }
+
+    def progress_view(self, request, object_id):
+        job = get_object_or_404(ImportJob, pk=object_id)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': job,
+            'progress': self.get_progress(job),
+        }
+
+        return render(request, 'administration/importjob_progress.html', context)
+
+    def progress_json(self, request, object_id):
+        job = get_object_or_404(ImportJob, pk=object_id)
+        return JsonResponse(self.get_progress(job))
+
+    def preview_view(self, request, object_id):
+        job = get_object_or_404(ImportJob, pk=object_id)
+        if job.diff is None:
+            return redirect('admin:administration_importjob_progress', job.pk)
+
+        importer = IMPORTERS[job.kind]
+        sections = [
+            {'key': key, 'title': title, 'count': len(job.diff[key])}
+            for key, title, _headers in importer.SECTIONS
+        ]
+        section = request.GET.get('section')
+        if section not in job.diff or section in ('unchanged', 'skipped'):
+            section = next((s['key'] for s in sections if s['count']), sections[0]['key'])
+
+        page = Paginator(job.diff[section], PREVIEW_PAGE_SIZE).get_page(request.GET.get('page'))
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'original': job,
+            'sections': sections,
+            'section': section,
+            'headers': dict((key, headers) for key, _title, headers in importer.SECTIONS)[section],
+            'rows': importer.diff_table(section, page.object_list),
+            'page': page,
+        }
+
+        return render(request, 'administration/importjob_preview.html', context)
+
+    def apply_view(self, request, object_id):
+        if request.method != 'POST':
+            return redirect('admin:administration_importjob_preview', object_id)
+
+        if ImportJob.schedule_apply(object_id, remove_memberships=request.POST.get('remove_memberships') == 'on'):
+            start_import_job(ImportJob.objects.get(pk=object_id))
+        else:
+            self.message_user(request, _('Эти изменения уже применяются или применены'), level=messages.ERROR)
+
+        return redirect('admin:administration_importjob_progress', object_id)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 from django.utils.translation import gettext_lazy as _
 
 
@@ -10,3 +11,6 @@ class AdministrationConfig(AppConfig):
     def ready(self):
         # noinspection PyUnresolvedReferences
         import administration.signals
+        from transfer.sqlite import configure_sqlite
+
+        connection_created.connect(configure_sqlite, dispatch_uid='transfer.sqlite.configure_sqlite')
@@ -0,0 +1,53 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Версии данных, из которых собираются страницы портала. Страница в кэше действительна,
+# пока не изменилась ни одна из версий, с которыми она была построена:
+# student — данные студента и его членство, teacher — преподаватель и его группы,
+# group — состав и заявки предметной группы, subject — все группы предмета,
+# all — общая версия для массовых изменений (импорт, пересчет).
+ALL = ('all', 0)
+
+
+def version_key(kind, pk):
+    return f'version:{kind}:{pk}'
+
+
+def get_versions(keys):
+    # Отсутствующие версии создаются, чтобы вытесненная из кэша версия не совпала с сохраненной
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def bump(students=(), teachers=(), groups=(), subjects=()):
+    # Новые версии ставятся после фиксации транзакции: иначе страница могла бы
+    # собраться из старых данных и сохраниться с уже новой версией
+    keys = (
+        [version_key('student', pk) for pk in set(students)]
+        + [version_key('teacher', pk) for pk in set(teachers)]
+        + [version_key('group', pk) for pk in set(groups)]
+        + [version_key('subject', pk) for pk in set(subjects)]
+    )
+    if keys:
+        transaction.on_commit(lambda: cache.set_many(dict.fromkeys(keys, uuid4().hex), None))
+
+
+def bump_groups(group_pks, students=(), teachers=()):
+    # Группы вместе с их предметами: в кабинете студента показываются все группы предмета
+    from .models import SubjectGroup
+
+    group_pks = set(group_pks)
+    subjects = SubjectGroup.objects.filter(pk__in=group_pks).values_list('subject_id', flat=True).distinct()
+    bump(students=students, teachers=teachers, groups=group_pks, subjects=list(subjects))
+
+
+def bump_all():
+    bump_key = version_key(*ALL)
+    transaction.on_commit(lambda: cache.set(bump_key, uuid4().hex, None))
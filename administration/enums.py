@@ -23,3 +23,15 @@ class Status(models.TextChoices):
     WAITING_ADMIN = 'waiting_admin', _('Ждет одобрения администратором')
     COMPLETED = 'completed', _('Выполнена')
     REJECTED = 'rejected', _('Отклонена')
+
+
+class ImportKind(models.TextChoices):
+    students = 'students', _('Студенты')
+    groups = 'groups', _('Группы')
+
+
+class JobStatus(models.TextChoices):
+    PENDING = 'pending', _('Ожидает')
+    RUNNING = 'running', _('Выполняется')
+    DONE = 'done', _('Завершен')
+    FAILED = 'failed', _('Ошибка')
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from collections import defaultdict, deque
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в секундах) процесс проверяет таблицу событий, записанных другими процессами
+POLL_INTERVAL = 0.5
+# Сколько хранятся события: столько клиент может пробыть без связи, не потеряв изменений
+RETENTION = timedelta(hours=1)
+CLEANUP_INTERVAL = timedelta(minutes=10)
+# Очередь подписчика; переполненная очередь теряет события, клиент все равно сверяет состояние целиком
+QUEUE_SIZE = 100
+
+
+def student_channel(pk):
+    return f'student:{pk}'
+
+
+def teacher_channel(pk):
+    return f'teacher:{pk}'
+
+
+def to_message(event):
+    return {
+        'id': event.pk,
+        'request': event.request_id,
+        'status': event.status,
+        'channel': event.channel,
+    }
+
+
+# Рассылка событий подписчикам SSE внутри процесса. Подписчики — очереди asyncio, ожидающее соединение
+# не занимает поток. События своего процесса приходят сразу из publish(), других процессов — через
+# таблицу TransferEvent, которую опрашивает одна задача на процесс; повторы отсекаются по id события
+class EventHub:
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.loop = None
+        self.poller = None
+        self.last_id = None
+        self.delivered = deque(maxlen=10000)
+        self.delivered_ids = set()
+        self.cleaned_at = None
+
+    def subscribe(self, channel):
+        # Вызывается из цикла событий; первый подписчик запускает опрос таблицы
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers[channel].add(queue)
+        if self.poller is None or self.poller.done():
+            self.poller = self.loop.create_task(self.poll())
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        queues = self.subscribers.get(channel)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[channel]
+
+    def dispatch(self, messages):
+        for message in messages:
+            if message['id'] in self.delivered_ids:
+                continue
+            if len(self.delivered) == self.delivered.maxlen:
+                self.delivered_ids.discard(self.delivered[0])
+            self.delivered.append(message['id'])
+            self.delivered_ids.add(message['id'])
+
+            for queue in self.subscribers.get(message['channel'], ()):
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    pass
+
+    def publish(self, messages):
+        # Из любого потока: передать события в цикл событий, если в процессе есть подписчики
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.dispatch, messages)
+        except RuntimeError:
+            pass
+
+    def stale_before(self):
+        # Граница для удаления устаревших событий или None, если процесс уже чистил таблицу
+        # за последние CLEANUP_INTERVAL. Чистят и publish(), и опрос: таблица не растет,
+        # даже если подписчиков нет
+        now = timezone.now()
+        if self.cleaned_at is not None and now - self.cleaned_at < CLEANUP_INTERVAL:
+            return None
+        self.cleaned_at = now
+        return now - RETENTION
+
+    async def poll(self):
+        from .models import TransferEvent
+
+        if self.last_id is None:
+            last = await TransferEvent.objects.order_by('-pk').afirst()
+            self.last_id = last.pk if last else 0
+
+        while self.subscribers:
+            try:
+                events = [
+                    event async for event in
+                    TransferEvent.objects.filter(pk__gt=self.last_id).order_by('pk')[:500]
+                ]
+                if events:
+                    self.last_id = events[-1].pk
+                    self.dispatch([to_message(event) for event in events])
+                    continue
+
+                stale_before = self.stale_before()
+                if stale_before is not None:
+                    await TransferEvent.objects.filter(created_at__lt=stale_before).adelete()
+            except Exception:
+                logger.exception('Ошибка при чтении таблицы событий')
+
+            await asyncio.sleep(POLL_INTERVAL)
+
+        # Подписчиков нет: следующий опрос начнется с текущего конца таблицы
+        self.last_id = None
+
+
+hub = EventHub()
+
+
+def publish(requests):
+    # События смены статуса для студента и преподавателей исходной и целевой групп заявки,
+    # пишутся и рассылаются после фиксации транзакции
+    from .models import SubjectGroup, TransferEvent
+
+    requests = list(requests)
+    if not requests:
+        return
+
+    teachers = defaultdict(set)
+    for group_id, teacher_id in SubjectGroup.teachers.through.objects.filter(
+            subjectgroup_id__in={pk for req in requests for pk in (req.from_group_id, req.to_group_id)}
+    ).values_list('subjectgroup_id', 'teacher_id'):
+        teachers[group_id].add(teacher_id)
+
+    events = [
+        TransferEvent(request_id=req.pk, status=req.status, channel=channel)
+        for req in requests
+        for channel in [student_channel(req.student_id)] + [
+            teacher_channel(pk) for pk in sorted(teachers[req.from_group_id] | teachers[req.to_group_id])
+        ]
+    ]
+
+    def send():
+        # События пишутся после фиксации и после смены версий кэша страниц (их on_commit
+        # зарегистрирован раньше): получив событие, клиент уже не получит устаревшее состояние
+        hub.publish([to_message(event) for event in TransferEvent.objects.bulk_create(events)])
+        stale_before = hub.stale_before()
+        if stale_before is not None:
+            TransferEvent.objects.filter(created_at__lt=stale_before).delete()
+
+    transaction.on_commit(send)
@@ -0,0 +1,281 @@
+import csv
+import zipfile
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from .enums import Semester, Status
+from .models import SubjectGroup
+
+# Сколько строк за раз забирается из БД курсором
+CHUNK_SIZE = 2000
+# Сколько строк файла отдается клиенту одной частью ответа
+ROWS_PER_PART = 200
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+}
+
+TRANSFER_COLUMNS = (
+    ('code', 'Код'),
+    ('student__full_name', 'Студент'),
+    ('student__email', 'Почта'),
+    ('subject__name', 'Предмет'),
+    ('from_group_id', 'Из предметной группы'),
+    ('from_group__group__name', 'Из учебной группы'),
+    ('to_group_id', 'В предметную группу'),
+    ('to_group__group__name', 'В учебную группу'),
+    ('status', 'Статус'),
+    ('created_at', 'Время подачи'),
+)
+
+ROSTER_COLUMNS = (
+    ('subjectgroup__subject__name', 'Предмет'),
+    ('subjectgroup__subject__year', 'Год'),
+    ('subjectgroup__subject__semester', 'Семестр'),
+    ('subjectgroup_id', 'Предметная группа'),
+    ('subjectgroup__group__name', 'Учебная группа'),
+    ('student__full_name', 'Студент'),
+    ('student__email', 'Почта'),
+)
+
+
+def transfer_rows(queryset, statuses=(Status.COMPLETED, Status.PENDING)):
+    # Заявки построчно: values_list и курсор, без создания экземпляров моделей
+    fields = [field for field, _title in TRANSFER_COLUMNS]
+    status_idx = fields.index('status')
+    labels = dict(Status.choices)
+
+    yield [title for _field, title in TRANSFER_COLUMNS]
+
+    rows = (
+        queryset
+        .filter(status__in=statuses)
+        .order_by('subject__name', 'created_at', 'pk')
+        .values_list(*fields)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for row in rows:
+        row = list(row)
+        row[status_idx] = str(labels[row[status_idx]])
+        yield row
+
+
+def roster_rows(queryset=None):
+    # Составы предметных групп: строка на студента, по промежуточной таблице
+    if queryset is None:
+        queryset = SubjectGroup.objects.all()
+
+    fields = [field for field, _title in ROSTER_COLUMNS]
+    semester_idx = fields.index('subjectgroup__subject__semester')
+    labels = dict(Semester.choices)
+
+    yield [title for _field, title in ROSTER_COLUMNS]
+
+    rows = (
+        SubjectGroup.students.through.objects
+        .filter(subjectgroup__in=queryset)
+        .order_by('subjectgroup__subject__name', 'subjectgroup_id', 'student__full_name')
+        .values_list(*fields)
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    for row in rows:
+        row = list(row)
+        row[semester_idx] = str(labels[row[semester_idx]])
+        yield row
+
+
+def to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return timezone.localtime(value).strftime('%d.%m.%Y %H:%M:%S')
+    return str(value)
+
+
+class Echo:
+    # Буфер для csv.writer: строка сразу возвращается генератору, ничего не копится
+    def write(self, value):
+        return value
+
+
+def write_csv(rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл файл в UTF-8
+    lines = ['\ufeff']
+    for row in rows:
+        lines.append(writer.writerow([to_text(value) for value in row]))
+        if len(lines) >= ROWS_PER_PART:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+class ZipStream:
+    # Неперематываемый файл для zipfile: записанные байты забираются генератором после каждой строки.
+    # Без seek zipfile пишет размеры в дескрипторы после данных, архив собирается за один проход.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def write_zip(files, rows, sheet, head, row_xml, tail):
+    # files — служебные части пакета, sheet — имя XML-листа, куда потоково пишутся строки
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data, compress_type in files:
+            archive.writestr(zipfile.ZipInfo(name), data, compress_type=compress_type)
+        yield stream.take()
+
+        with archive.open(sheet, 'w') as content:
+            content.write(head.encode())
+            for i, row in enumerate(rows, start=1):
+                content.write(row_xml(i, row).encode())
+                if i % ROWS_PER_PART == 0:
+                    yield stream.take()
+            content.write(tail.encode())
+
+    yield stream.take()
+
+
+def xlsx_cell(value):
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(to_text(value))}</t></is></c>'
+
+
+XLSX_FILES = (
+    ('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ), zipfile.ZIP_DEFLATED),
+    ('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ), zipfile.ZIP_DEFLATED),
+    ('xl/workbook.xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Лист1" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ), zipfile.ZIP_DEFLATED),
+    ('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ), zipfile.ZIP_DEFLATED),
+)
+
+
+def write_xlsx(rows):
+    return write_zip(
+        XLSX_FILES,
+        rows,
+        'xl/worksheets/sheet1.xml',
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>',
+        lambda i, row: f'<row r="{i}">{"".join(xlsx_cell(value) for value in row)}</row>',
+        '</sheetData></worksheet>'
+    )
+
+
+def ods_cell(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (
+            f'<table:table-cell office:value-type="float" office:value="{value}">'
+            f'<text:p>{value}</text:p></table:table-cell>'
+        )
+    return (
+        f'<table:table-cell office:value-type="string">'
+        f'<text:p>{escape(to_text(value))}</text:p></table:table-cell>'
+    )
+
+
+ODS_FILES = (
+    # mimetype обязан идти первым и без сжатия
+    ('mimetype', 'application/vnd.oasis.opendocument.spreadsheet', zipfile.ZIP_STORED),
+    ('META-INF/manifest.xml', (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" '
+        'manifest:version="1.2">'
+        '<manifest:file-entry manifest:full-path="/" '
+        'manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>'
+        '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+        '</manifest:manifest>'
+    ), zipfile.ZIP_DEFLATED),
+)
+
+
+def write_ods(rows):
+    return write_zip(
+        ODS_FILES,
+        rows,
+        'content.xml',
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<office:document-content'
+        ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+        ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+        ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+        ' office:version="1.2">'
+        '<office:body><office:spreadsheet><table:table table:name="Лист1">',
+        lambda i, row: f'<table:table-row>{"".join(ods_cell(value) for value in row)}</table:table-row>',
+        '</table:table></office:spreadsheet></office:body></office:document-content>'
+    )
+
+
+WRITERS = {
+    'csv': write_csv,
+    'xlsx': write_xlsx,
+    'ods': write_ods,
+}
+
+
+def export(rows, fmt):
+    # Поток частей файла (str для csv, bytes для xlsx/ods)
+    return WRITERS[fmt](rows)
+
+
+def export_response(rows, fmt, name):
+    if fmt not in WRITERS:
+        raise Http404
+
+    response = StreamingHttpResponse(export(rows, fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
@@ -0,0 +1,208 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import transaction
+
+from . import cache_versions
+from .models import Settings, Student, SubjectGroup, process_pending_requests_for_groups
+
+# Снимок для процессов пула: передается один раз при запуске процесса, а не с каждым предметом
+_snapshot = None
+
+
+def load_snapshot(subjects):
+    # Студенты одним проходом для всех предметов: по курсу — (учебная группа, студент, факультет),
+    # по кафедре — студенты
+    pairs = Student.groups.through.objects.filter(student__year__in={subject.course for subject in subjects})
+    if len(subjects) == 1 and subjects[0].faculty_id is not None:
+        pairs = pairs.filter(group__faculty_id=subjects[0].faculty_id)
+
+    pairs_by_year = defaultdict(list)
+    for group_id, student_id, year, faculty_id in pairs.values_list(
+            'group_id', 'student_id', 'student__year', 'group__faculty_id').distinct():
+        pairs_by_year[year].append((group_id, student_id, faculty_id))
+
+    department_students = defaultdict(set)
+    department_ids = {subject.department_id for subject in subjects} - {None}
+    if department_ids:
+        for department_id, student_id in Student.departments.through.objects.filter(
+                department_id__in=department_ids).values_list('department_id', 'student_id'):
+            department_students[department_id].add(student_id)
+
+    return dict(pairs_by_year), dict(department_students)
+
+
+def plan_subject(snapshot, course, faculty_id, department_id, placed):
+    # Учебная группа → студенты, которых нужно добавить в предметную группу; в БД не обращается
+    pairs_by_year, department_students = snapshot
+    members = department_students.get(department_id, set()) if department_id is not None else None
+
+    groups_map = defaultdict(set)
+    for group_id, student_id, group_faculty_id in pairs_by_year.get(course, ()):
+        if faculty_id is not None and group_faculty_id != faculty_id:
+            continue
+        if members is not None and student_id not in members:
+            continue
+        if student_id not in placed:
+            groups_map[group_id].add(student_id)
+
+    return groups_map
+
+
+def _init_worker(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+
+
+def _plan_in_worker(task):
+    subject_id, course, faculty_id, department_id, placed = task
+    started = time.perf_counter()
+    groups_map = plan_subject(_snapshot, course, faculty_id, department_id, placed)
+    return subject_id, groups_map, time.perf_counter() - started
+
+
+def generate_subject_groups(subjects, workers=None):
+    # Снимок студентов загружается один раз, распределение считается в памяти (при workers > 1 —
+    # в пуле процессов), группы и членства пишутся общими bulk-запросами. Повторный запуск
+    # дополняет только недостающее. Возвращает {pk предмета: результат}
+    subjects = list(subjects)
+    if not subjects:
+        return {}
+
+    snapshot = load_snapshot(subjects)
+
+    through = SubjectGroup.students.through
+    placed = defaultdict(set)
+    for subject_id, student_id in through.objects.filter(subjectgroup__subject__in=subjects).values_list(
+            'subjectgroup__subject_id', 'student_id'):
+        placed[subject_id].add(student_id)
+
+    tasks = [
+        (subject.pk, subject.course, subject.faculty_id, subject.department_id, placed[subject.pk])
+        for subject in subjects
+    ]
+
+    if workers and workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,)) as pool:
+            planned = list(pool.map(_plan_in_worker, tasks))
+    else:
+        _init_worker(snapshot)
+        planned = [_plan_in_worker(task) for task in tasks]
+
+    results = {
+        subject_id: {'created': 0, 'added': sum(map(len, groups_map.values())), 'seconds': elapsed}
+        for subject_id, groups_map, elapsed in planned
+    }
+    planned = [(subject_id, groups_map) for subject_id, groups_map, _elapsed in planned if groups_map]
+    if not planned:
+        return results
+
+    with transaction.atomic():
+        existing = {}
+        for subject_id, group_id, pk in (
+                SubjectGroup.objects
+                .filter(subject__in=[subject_id for subject_id, _groups_map in planned], group__isnull=False)
+                .order_by('-pk')
+                .values_list('subject_id', 'group_id', 'pk')):
+            existing[subject_id, group_id] = pk
+
+        admin_settings = Settings.load()
+        created = SubjectGroup.objects.bulk_create(
+            [
+                SubjectGroup(
+                    subject_id=subject_id,
+                    group_id=group_id,
+                    min_students=admin_settings.default_min_students,
+                    max_students=admin_settings.default_max_students,
+                    deadline=admin_settings.default_deadline
+                )
+                for subject_id, groups_map in planned
+                for group_id in groups_map
+                if (subject_id, group_id) not in existing
+            ],
+            batch_size=1000
+        )
+        for sg in created:
+            existing[sg.subject_id, sg.group_id] = sg.pk
+            results[sg.subject_id]['created'] += 1
+
+        through.objects.bulk_create(
+            [
+                through(subjectgroup_id=existing[subject_id, group_id], student_id=student_id)
+                for subject_id, groups_map in planned
+                for group_id, student_ids in groups_map.items()
+                for student_id in student_ids
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+        pks = [existing[subject_id, group_id] for subject_id, groups_map in planned for group_id in groups_map]
+        SubjectGroup.recount_students(pks)
+        process_pending_requests_for_groups(pks)
+
+        cache_versions.bump(
+            students={
+                student_id
+                for _subject_id, groups_map in planned
+                for student_ids in groups_map.values()
+                for student_id in student_ids
+            },
+            groups=pks,
+            subjects=[subject_id for subject_id, _groups_map in planned]
+        )
+
+    return results
+
+
+def create_subject_groups_for_groups(groups, subjects):
+    # Предметная группа с составом учебной группы для каждой пары (учебная группа, предмет), у которой
+    # ее еще нет, одной транзакцией. Возвращает (созданные группы, пропущено пар, добавлено студентов)
+    group_ids = [group.pk for group in groups]
+    subject_ids = [subject.pk for subject in subjects]
+
+    members = defaultdict(list)
+    for group_id, student_id in Student.groups.through.objects.filter(group_id__in=group_ids).values_list(
+            'group_id', 'student_id'):
+        members[group_id].append(student_id)
+
+    through = SubjectGroup.students.through
+    with transaction.atomic():
+        existing = set(
+            SubjectGroup.objects
+            .filter(subject_id__in=subject_ids, group_id__in=group_ids)
+            .values_list('subject_id', 'group_id')
+        )
+
+        admin_settings = Settings.load()
+        created = SubjectGroup.objects.bulk_create([
+            SubjectGroup(
+                subject_id=subject_id,
+                group_id=group_id,
+                min_students=admin_settings.default_min_students,
+                max_students=admin_settings.default_max_students,
+                deadline=admin_settings.default_deadline,
+                students_count=len(members[group_id])
+            )
+            for subject_id in subject_ids
+            for group_id in group_ids
+            if (subject_id, group_id) not in existing
+        ])
+
+        through.objects.bulk_create(
+            [
+                through(subjectgroup_id=sg.pk, student_id=student_id)
+                for sg in created
+                for student_id in members[sg.group_id]
+            ],
+            batch_size=1000
+        )
+
+        cache_versions.bump(
+            students=[student_id for sg in created for student_id in members[sg.group_id]],
+            groups=[sg.pk for sg in created],
+            subjects=subject_ids
+        )
+
+    return created, len(existing), sum(sg.students_count for sg in created)
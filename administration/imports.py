@@ -0,0 +1,726 @@
+import subprocess
+import sys
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from . import cache_versions
+from .enums import EducationSystem, ImportKind, JobStatus, Sex
+from .models import Faculty, Department, Group, Student
+from .ods import iter_ods_chunks
+
+# Сколько строк файла читается, очищается и сохраняется за один раз
+CHUNK_SIZE = 2000
+
+SEX_BY_TEXT = {
+    'мужской': Sex.male,
+    'женский': Sex.female,
+}
+
+
+def get_engine():
+    # 'pandas' очищает каждый кусок файла целыми колонками DataFrame, 'python' — построчно без загрузки pandas
+    return getattr(settings, 'ODS_IMPORT_ENGINE', 'pandas')
+
+
+def get_column_indexes(header, columns):
+    try:
+        return [header.index(column) for column in columns]
+    except ValueError as e:
+        raise ValueError(f'В заголовке отсутствует колонка: {e}')
+
+
+class ReferenceResolver:
+    # Справочники импорта, загружаемые один раз на файл: поиск по строке файла идет по словарям,
+    # а недостающие факультеты и кафедры создаются одним запросом на кусок
+    def __init__(self):
+        self.faculty_ids = self.load_names(Faculty)
+        self.department_ids = self.load_names(Department)
+
+        self.groups = Group.objects.in_bulk(field_name='code')
+
+        # При совпадающих названиях берется группа с наибольшим кодом
+        self.group_ids = {}
+        for code in sorted(self.groups, reverse=True):
+            self.group_ids.setdefault(self.groups[code].name, self.groups[code].pk)
+
+    @staticmethod
+    def load_names(model):
+        ids = {}
+        for pk, name in model.objects.order_by('pk').values_list('pk', 'name'):
+            ids.setdefault(name, pk)
+        return ids
+
+    @staticmethod
+    def create_missing(model, ids, names):
+        missing = set(names) - set(ids) - {'', None}
+        for obj in model.objects.bulk_create([model(name=name) for name in sorted(missing)]):
+            ids[obj.name] = obj.pk
+
+    def add_faculties(self, names):
+        self.create_missing(Faculty, self.faculty_ids, names)
+
+    def add_departments(self, names):
+        self.create_missing(Department, self.department_ids, names)
+
+    def faculty_id(self, name):
+        return self.faculty_ids.get(name) if name else None
+
+    def department_id(self, name):
+        return self.department_ids.get(name) if name else None
+
+
+class FileImport(ABC):
+    MARKER = None
+    COLUMNS = ()
+
+    def __init__(self):
+        self.created = self.updated = self.skipped = 0
+
+    def run(self, file_obj, chunk_size=CHUNK_SIZE, on_chunk=None):
+        # Без on_chunk файл применяется одной транзакцией, с ним — отдельной транзакцией на каждый кусок
+        with nullcontext() if on_chunk else transaction.atomic():
+            self.load()
+
+            for header, rows in iter_ods_chunks(file_obj, self.MARKER, chunk_size):
+                with transaction.atomic():
+                    self.save(self.clean(header, rows))
+                if on_chunk:
+                    on_chunk(self, len(rows))
+
+        return self.created, self.updated, self.skipped
+
+    def preview(self, file_obj, chunk_size=CHUNK_SIZE, on_chunk=None):
+        # Пробный прогон: файл разбирается целиком, но в БД ничего не пишется.
+        # Желаемое состояние копится в памяти и сравнивается со снимком БД множествами.
+        self.load()
+        self.records = {}
+
+        for header, rows in iter_ods_chunks(file_obj, self.MARKER, chunk_size):
+            self.collect(self.clean(header, rows))
+            if on_chunk:
+                on_chunk(self, len(rows))
+
+        diff = self.make_diff()
+        self.created, self.updated = len(diff['new']), len(diff['changed'])
+        diff['unchanged'] = len(self.records) - self.created - self.updated
+        diff['skipped'] = self.skipped
+        return diff
+
+    @classmethod
+    def diff_table(cls, section, entries):
+        # Строки таблицы предпросмотра для части записей раздела diff
+        if section not in ('new', 'changed'):
+            return [entry if isinstance(entry, list) else [entry] for entry in entries]
+
+        rows = []
+        for entry in entries:
+            old = entry.get('old', {})
+            rows.append([entry['key']] + [
+                f'{old[field]} → {entry["values"][field]}' if field in old else entry['values'][field]
+                for field in cls.DIFF_FIELDS
+            ])
+        return rows
+
+    @staticmethod
+    def split_diff(records, existing):
+        new, changed = [], []
+        for key, values in records.items():
+            if key not in existing:
+                new.append({'key': key, 'values': values})
+            elif existing[key] != values:
+                old = {field: value for field, value in existing[key].items() if values[field] != value}
+                changed.append({'key': key, 'values': values, 'old': old})
+        return new, changed
+
+    def load(self):
+        self.references = ReferenceResolver()
+
+    @abstractmethod
+    def clean(self, header, rows):
+        pass
+
+    @abstractmethod
+    def save(self, records):
+        pass
+
+    @abstractmethod
+    def collect(self, records):
+        pass
+
+    @abstractmethod
+    def make_diff(self):
+        pass
+
+    @abstractmethod
+    def apply(self, diff, remove_memberships=False):
+        pass
+
+
+class StudentImport(FileImport):
+    MARKER = 'Студент'
+    COLUMNS = (
+        'Студент',
+        'Группа',
+        'Кафедра',
+        'Курс',
+        'Пол',
+        'Дата рождения',
+        'Адрес электронной почты физтех',
+    )
+
+    DIFF_FIELDS = ('full_name', 'sex', 'year', 'birthdate')
+    SECTIONS = (
+        ('unknown_groups', _('Неизвестные группы'), ('Почта', 'Группа')),
+        ('new', _('Новые студенты'), ('Почта', 'ФИО', 'Пол', 'Курс', 'Дата рождения')),
+        ('changed', _('Изменённые студенты'), ('Почта', 'ФИО', 'Пол', 'Курс', 'Дата рождения')),
+        ('groups_added', _('Добавления в группы'), ('Почта', 'pk группы', 'Группа')),
+        ('groups_removed', _('Исключения из групп'), ('Почта', 'pk группы', 'Группа')),
+        ('departments_new', _('Новые кафедры'), ('Кафедра',)),
+        ('departments_added', _('Добавления на кафедры'), ('Почта', 'Кафедра')),
+        ('departments_removed', _('Исключения с кафедр'), ('Почта', 'pk кафедры', 'Кафедра')),
+    )
+
+    def __init__(self, engine=None):
+        super().__init__()
+        self.engine = engine or get_engine()
+
+    def load(self):
+        super().load()
+        self.students = Student.objects.in_bulk(field_name='email')
+        self.file_groups, self.file_departments = defaultdict(set), defaultdict(set)
+        self.unknown_groups = set()
+
+    def clean(self, header, rows):
+        indexes = get_column_indexes(header, self.COLUMNS)
+        if self.engine == 'pandas':
+            return self.clean_frame(indexes, rows)
+        return self.clean_rows(indexes, rows)
+
+    def clean_frame(self, indexes, rows):
+        # Очистка значений целыми колонками DataFrame
+        import pandas as pd
+
+        width = max(indexes) + 1
+        data = pd.DataFrame(
+            [row[:width] + [None] * (width - len(row)) for row in rows],
+            columns=range(width),
+            dtype=object
+        )
+        idx_full_name, idx_group, idx_department, idx_year, idx_sex, idx_birthdate, idx_email = indexes
+
+        def text(col_idx):
+            col = data[col_idx]
+            return col.where(col.notna(), '').astype(str).str.strip()
+
+        year = pd.to_numeric(text(idx_year), errors='coerce')
+
+        cleaned = pd.DataFrame({
+            'full_name': text(idx_full_name),
+            'group': text(idx_group),
+            'department': text(idx_department),
+            'year': year.where(year == year.round()).astype('Int64'),
+            'sex': text(idx_sex).str.lower().map(SEX_BY_TEXT).fillna(''),
+            'birthdate': pd.to_datetime(text(idx_birthdate), format='%d.%m.%Y', errors='coerce').dt.date,
+            'email': text(idx_email),
+        })
+
+        valid = (cleaned['full_name'] != '') & (cleaned['email'] != '')
+        self.skipped += int((~valid).sum())
+
+        cleaned = cleaned[valid]
+        cleaned = cleaned.astype(object).where(cleaned.notna(), None)
+
+        return list(cleaned.itertuples(index=False, name=None))
+
+    def clean_rows(self, indexes, rows):
+        # Та же очистка построчно, без pandas
+        cleaned = []
+        for row in rows:
+            full_name, group_name, dept_name, year_text, sex_text, birthdate_txt, email = [
+                '' if i >= len(row) or row[i] is None else str(row[i]).strip()
+                for i in indexes
+            ]
+
+            if not full_name or not email:
+                self.skipped += 1
+                continue
+
+            try:
+                year = float(year_text)
+                year = int(year) if year.is_integer() else None
+            except ValueError:
+                year = None
+
+            try:
+                birthdate = datetime.strptime(birthdate_txt, '%d.%m.%Y').date()
+            except ValueError:
+                birthdate = None
+
+            cleaned.append((
+                full_name,
+                group_name,
+                dept_name,
+                year,
+                SEX_BY_TEXT.get(sex_text.lower(), ''),
+                birthdate,
+                email,
+            ))
+
+        return cleaned
+
+    def save(self, rows):
+        # Студенты и членства пишутся пачками
+        self.references.add_departments(row[2] for row in rows)
+
+        to_create, to_update = {}, {}
+        group_links, department_links = set(), set()
+
+        for full_name, group_name, dept_name, year, sex, birthdate, email in rows:
+            stu = self.students.get(email)
+
+            if stu is None:
+                stu = Student(
+                    full_name=full_name,
+                    year=year,
+                    sex=sex,
+                    birthdate=birthdate,
+                    email=email
+                )
+                self.students[email] = to_create[email] = stu
+                self.created += 1
+
+            elif (stu.full_name, stu.sex, stu.year, stu.birthdate) != (full_name, sex, year, birthdate):
+                stu.full_name = full_name
+                stu.sex = sex
+                stu.year = year
+                stu.birthdate = birthdate
+                if stu.pk:
+                    to_update[email] = stu
+                self.updated += 1
+
+            if group_name in self.references.group_ids:
+                group_links.add((email, self.references.group_ids[group_name]))
+            if dept_name:
+                department_links.add((email, self.references.department_id(dept_name)))
+
+        # Новый студент мог появиться после загрузки справочника (параллельный импорт) — тогда он обновляется
+        Student.objects.bulk_create(
+            to_create.values(),
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['email'],
+            update_fields=['full_name', 'sex', 'year', 'birthdate']
+        )
+        Student.objects.bulk_update(
+            to_update.values(),
+            ['full_name', 'sex', 'year', 'birthdate'],
+            batch_size=1000
+        )
+        if to_update:
+            # Имена студентов есть на страницах портала, а bulk_update не вызывает post_save
+            cache_versions.bump_all()
+
+        Student.groups.through.objects.bulk_create(
+            [
+                Student.groups.through(student_id=self.students[email].pk, group_id=group_id)
+                for email, group_id in group_links
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+        Student.departments.through.objects.bulk_create(
+            [
+                Student.departments.through(student_id=self.students[email].pk, department_id=dept_id)
+                for email, dept_id in department_links
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def to_diff_values(full_name, sex, year, birthdate):
+        return {
+            'full_name': full_name,
+            'sex': str(sex),
+            'year': year,
+            'birthdate': birthdate.isoformat() if birthdate else None,
+        }
+
+    def collect(self, rows):
+        for full_name, group_name, dept_name, year, sex, birthdate, email in rows:
+            # Как и при импорте, для повторной почты берутся значения последней строки, а членства объединяются
+            self.records[email] = self.to_diff_values(full_name, sex, year, birthdate)
+            if group_name in self.references.group_ids:
+                self.file_groups[email].add(self.references.group_ids[group_name])
+            elif group_name:
+                # Импорт такую строку молча пропускает, в предпросмотре это ошибка
+                self.unknown_groups.add((email, group_name))
+            if dept_name:
+                self.file_departments[email].add(dept_name)
+
+    def make_diff(self):
+        existing = {
+            email: self.to_diff_values(stu.full_name, stu.sex, stu.year, stu.birthdate)
+            for email, stu in self.students.items()
+            if email in self.records
+        }
+        new, changed = self.split_diff(self.records, existing)
+
+        # Членства сравниваются только для студентов из файла. Исключения — только у тех, чья строка
+        # указывает известную группу (непустую кафедру): пустая или неизвестная ячейка ничего не удаляет
+        db_groups, db_departments = defaultdict(set), defaultdict(dict)
+        for email, group_id in Student.groups.through.objects.values_list('student__email', 'group_id'):
+            if email in self.records:
+                db_groups[email].add(group_id)
+        for email, dept_id, dept_name in Student.departments.through.objects.values_list(
+                'student__email', 'department_id', 'department__name'):
+            if email in self.records:
+                db_departments[email][dept_name] = dept_id
+
+        group_names = {grp.pk: grp.name for grp in self.references.groups.values()}
+        file_department_names = set().union(*self.file_departments.values())
+
+        return {
+            'unknown_groups': [[email, name] for email, name in sorted(self.unknown_groups)],
+            'new': new,
+            'changed': changed,
+            'groups_added': [
+                [email, group_id, group_names[group_id]]
+                for email in sorted(self.records)
+                for group_id in sorted(self.file_groups[email] - db_groups[email])
+            ],
+            'groups_removed': [
+                [email, group_id, group_names.get(group_id)]
+                for email in sorted(db_groups)
+                if self.file_groups.get(email)
+                for group_id in sorted(db_groups[email] - self.file_groups[email])
+            ],
+            'departments_new': sorted(file_department_names - set(self.references.department_ids)),
+            'departments_added': [
+                [email, name]
+                for email in sorted(self.records)
+                for name in sorted(self.file_departments[email] - set(db_departments[email]))
+            ],
+            'departments_removed': [
+                [email, dept_id, name]
+                for email in sorted(db_departments)
+                if self.file_departments.get(email)
+                for name, dept_id in sorted(db_departments[email].items())
+                if name not in self.file_departments[email]
+            ],
+        }
+
+    def apply(self, diff, remove_memberships=False):
+        # Применение сохраненного diff без повторного разбора файла. Импорт файла членства
+        # только добавляет, поэтому исключения из групп и с кафедр выполняются лишь по запросу
+        with transaction.atomic():
+            self.load()
+            self.references.add_departments(diff['departments_new'])
+
+            students = [
+                Student(
+                    email=entry['key'],
+                    full_name=entry['values']['full_name'],
+                    sex=entry['values']['sex'],
+                    year=entry['values']['year'],
+                    birthdate=date.fromisoformat(entry['values']['birthdate']) if entry['values']['birthdate'] else None
+                )
+                for entry in diff['new'] + diff['changed']
+            ]
+            Student.objects.bulk_create(
+                students,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['email'],
+                update_fields=list(self.DIFF_FIELDS)
+            )
+            self.created, self.updated, self.skipped = len(diff['new']), len(diff['changed']), diff['skipped']
+            if diff['changed']:
+                cache_versions.bump_all()
+
+            student_ids = dict(Student.objects.values_list('email', 'pk'))
+
+            Student.groups.through.objects.bulk_create(
+                [
+                    Student.groups.through(student_id=student_ids[email], group_id=group_id)
+                    for email, group_id, _name in diff['groups_added']
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+            Student.departments.through.objects.bulk_create(
+                [
+                    Student.departments.through(
+                        student_id=student_ids[email],
+                        department_id=self.references.department_id(name)
+                    )
+                    for email, name in diff['departments_added']
+                ],
+                batch_size=1000,
+                ignore_conflicts=True
+            )
+
+            if not remove_memberships:
+                return self.created, self.updated, self.skipped
+
+            # Удаления — одним запросом на группу (кафедру), а не на студента
+            removed = defaultdict(list)
+            for email, group_id, _name in diff['groups_removed']:
+                removed[group_id].append(student_ids[email])
+            for group_id, pks in removed.items():
+                Student.groups.through.objects.filter(group_id=group_id, student_id__in=pks).delete()
+
+            removed = defaultdict(list)
+            for email, dept_id, _name in diff['departments_removed']:
+                removed[dept_id].append(student_ids[email])
+            for dept_id, pks in removed.items():
+                Student.departments.through.objects.filter(department_id=dept_id, student_id__in=pks).delete()
+
+        return self.created, self.updated, self.skipped
+
+
+class GroupImport(FileImport):
+    MARKER = 'Код'
+    COLUMNS = (
+        'Архивная',
+        'Наименование',
+        'Код',
+        'Номер группы',
+        'Физтех-школа (факультет)',
+        'Учебный поток',
+        'Форма обучения',
+        'Индекс группы',
+        'Кафедра',
+    )
+    FIELDS = ('archive', 'name', 'number', 'faculty_id', 'stream', 'education_system', 'index', 'department_id')
+    DIFF_FIELDS = ('archive', 'name', 'number', 'faculty', 'stream', 'education_system', 'index', 'department')
+    SECTIONS = (
+        ('new', _('Новые группы'), ('Код',) + COLUMNS[:2] + COLUMNS[3:]),
+        ('changed', _('Изменённые группы'), ('Код',) + COLUMNS[:2] + COLUMNS[3:]),
+        ('faculties_new', _('Новые факультеты'), ('Факультет',)),
+        ('departments_new', _('Новые кафедры'), ('Кафедра',)),
+    )
+
+    def clean(self, header, rows):
+        indexes = get_column_indexes(header, self.COLUMNS)
+        idx_archive, idx_name, idx_code, idx_number, idx_faculty, idx_stream, idx_edu, idx_index, idx_department = indexes
+
+        cleaned = []
+        for row in rows:
+            def get_cell(col_idx):
+                v = row[col_idx] if col_idx < len(row) else None
+                return None if v is None else str(v).strip()
+
+            archive_text = get_cell(idx_archive)
+            name = get_cell(idx_name)
+            code_text = get_cell(idx_code)
+            number_text = get_cell(idx_number)
+            faculty = get_cell(idx_faculty)
+            stream = get_cell(idx_stream)
+            edu_text = get_cell(idx_edu)
+            index_text = get_cell(idx_index)
+            dept = get_cell(idx_department)
+
+            if not name or not code_text:
+                self.skipped += 1
+                continue
+
+            # Преобразуем код в int (убрав пробелы/неразрывные пробелы)
+            try:
+                code = int(code_text.replace('\xa0', '').replace(' ', ''))
+            except ValueError:
+                code = None
+
+            archive = False
+            if archive_text.lower() in ('да', 'true', '1'):
+                archive = True
+
+            number = None
+            if number_text:
+                try:
+                    number = int(number_text)
+                except ValueError:
+                    number = None
+
+            edu = None
+            if edu_text.lower() == 'очная':
+                edu = EducationSystem.regular
+            elif edu_text.lower() == 'заочная':
+                edu = EducationSystem.online
+
+            cleaned.append((code, archive, name, number, faculty, stream, edu, index_text, dept))
+
+        return cleaned
+
+    def save(self, rows):
+        # Факультеты и кафедры заводятся и для строк с некорректным кодом, как при построчном get_or_create
+        self.references.add_faculties(row[4] for row in rows)
+        self.references.add_departments(row[8] for row in rows)
+
+        groups = self.references.groups
+        to_create, to_update = {}, {}
+
+        for code, archive, name, number, faculty, stream, edu, index_text, dept in rows:
+            if code is None:
+                self.skipped += 1
+                continue
+
+            values = (
+                archive,
+                name,
+                number,
+                self.references.faculty_id(faculty),
+                stream,
+                edu,
+                index_text,
+                self.references.department_id(dept),
+            )
+
+            grp = groups.get(code)
+            if grp is None:
+                grp = Group(code=code, **dict(zip(self.FIELDS, values)))
+                groups[code] = to_create[code] = grp
+                self.created += 1
+
+            elif tuple(getattr(grp, field) for field in self.FIELDS) != values:
+                for field, value in zip(self.FIELDS, values):
+                    setattr(grp, field, value)
+                if grp.pk:
+                    to_update[code] = grp
+                self.updated += 1
+
+        Group.objects.bulk_create(to_create.values(), batch_size=1000)
+        Group.objects.bulk_update(
+            to_update.values(),
+            ['archive', 'name', 'number', 'faculty', 'stream', 'education_system', 'index', 'department'],
+            batch_size=1000
+        )
+
+    def collect(self, rows):
+        for code, *values in rows:
+            if code is None:
+                self.skipped += 1
+                continue
+            self.records[code] = dict(zip(self.DIFF_FIELDS, values))
+            self.records[code]['education_system'] = values[5] and str(values[5])
+
+    def make_diff(self):
+        faculty_names = dict(Faculty.objects.values_list('pk', 'name'))
+        department_names = dict(Department.objects.values_list('pk', 'name'))
+
+        existing = {
+            code: {
+                'archive': grp.archive,
+                'name': grp.name,
+                'number': grp.number,
+                'faculty': faculty_names.get(grp.faculty_id),
+                'stream': grp.stream,
+                'education_system': grp.education_system,
+                'index': grp.index,
+                'department': department_names.get(grp.department_id),
+            }
+            for code, grp in self.references.groups.items()
+            if code in self.records
+        }
+        new, changed = self.split_diff(self.records, existing)
+
+        values = self.records.values()
+        return {
+            'new': new,
+            'changed': changed,
+            'faculties_new': sorted({v['faculty'] for v in values} - set(self.references.faculty_ids) - {'', None}),
+            'departments_new': sorted(
+                {v['department'] for v in values} - set(self.references.department_ids) - {'', None}
+            ),
+        }
+
+    def apply(self, diff, remove_memberships=False):
+        # Применение сохраненного diff без повторного разбора файла; членств у групп нет
+        with transaction.atomic():
+            self.load()
+            self.references.add_faculties(diff['faculties_new'])
+            self.references.add_departments(diff['departments_new'])
+
+            groups = []
+            for entry in diff['new'] + diff['changed']:
+                values = entry['values']
+                groups.append(Group(
+                    code=entry['key'],
+                    archive=values['archive'],
+                    name=values['name'],
+                    number=values['number'],
+                    faculty_id=self.references.faculty_id(values['faculty']),
+                    stream=values['stream'],
+                    education_system=values['education_system'],
+                    index=values['index'],
+                    department_id=self.references.department_id(values['department']),
+                ))
+
+            Group.objects.bulk_create(
+                groups,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['code'],
+                update_fields=list(self.FIELDS)
+            )
+            self.created, self.updated, self.skipped = len(diff['new']), len(diff['changed']), diff['skipped']
+            if diff['changed']:
+                cache_versions.bump_all()
+
+        return self.created, self.updated, self.skipped
+
+
+IMPORTERS = {
+    ImportKind.students: StudentImport,
+    ImportKind.groups: GroupImport,
+}
+
+PROGRESS_FIELDS = ['rows_processed', 'created', 'updated', 'skipped', 'progress_at']
+
+
+def run_import_job(job):
+    # Выполняется в процессе обработчика: прогресс сохраняется после каждого куска
+    importer = IMPORTERS[job.kind]()
+
+    def on_chunk(importer, rows):
+        job.rows_processed += rows
+        job.created, job.updated, job.skipped = importer.created, importer.updated, importer.skipped
+        job.progress_at = timezone.now()
+        job.save(update_fields=PROGRESS_FIELDS)
+
+    try:
+        if job.dry_run:
+            with job.file.open('rb') as file_obj:
+                job.diff = importer.preview(file_obj, on_chunk=on_chunk)
+        elif job.diff is not None:
+            importer.apply(job.diff, remove_memberships=job.remove_memberships)
+        else:
+            with job.file.open('rb') as file_obj:
+                importer.run(file_obj, on_chunk=on_chunk)
+        job.status = JobStatus.DONE
+    except Exception as e:
+        job.errors.append(str(e))
+        job.status = JobStatus.FAILED
+
+    job.created, job.updated, job.skipped = importer.created, importer.updated, importer.skipped
+    job.progress_at = job.finished_at = timezone.now()
+    job.save(update_fields=PROGRESS_FIELDS + ['diff', 'status', 'errors', 'finished_at'])
+
+
+def start_import_job(job):
+    # Каждое задание обрабатывается отдельным процессом manage.py, веб-воркер не ждет окончания импорта
+    subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_import_jobs', str(job.pk)],
+        cwd=settings.BASE_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from administration.enums import Status
+from administration.exports import WRITERS, export, roster_rows, transfer_rows
+from administration.models import SubjectGroup, TransferRequest
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить заявки на перевод или составы предметных групп в CSV, XLSX или ODS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('what', choices=['transfers', 'rosters'])
+        parser.add_argument('--format', choices=list(WRITERS), default='csv', dest='fmt')
+        parser.add_argument('--output', help='файл; без него выгрузка идет в stdout')
+        parser.add_argument('--status', action='append', choices=Status.values, dest='statuses',
+                            help='статус заявок, можно указать несколько раз; по умолчанию выполненные и в очереди')
+        parser.add_argument('--faculty', type=int, help='pk факультета предмета')
+
+    def handle(self, *args, **options):
+        if options['what'] == 'transfers':
+            queryset = TransferRequest.objects.all()
+            if options['faculty']:
+                queryset = queryset.filter(subject__faculty_id=options['faculty'])
+            rows = transfer_rows(queryset, options['statuses'] or [Status.COMPLETED, Status.PENDING])
+        else:
+            queryset = SubjectGroup.objects.all()
+            if options['faculty']:
+                queryset = queryset.filter(subject__faculty_id=options['faculty'])
+            rows = roster_rows(queryset)
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for part in export(rows, options['fmt']):
+                out.write(part.encode() if isinstance(part, str) else part)
+        finally:
+            if options['output']:
+                out.close()
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from administration.enums import Semester
+from administration.grouping import generate_subject_groups
+from administration.models import Subject
+from administration.utils import current_semester, current_year
+
+
+class Command(BaseCommand):
+    help = 'Сформировать предметные группы для всех предметов семестра'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='учебный год, по умолчанию текущий')
+        parser.add_argument('--semester', choices=Semester.values, help='семестр, по умолчанию текущий')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='процессов для расчета распределения по предметам')
+
+    def handle(self, *args, **options):
+        subjects = Subject.objects.filter(
+            year=options['year'] or current_year(),
+            semester=options['semester'] or current_semester()
+        ).select_related('faculty', 'department')
+
+        # Как и кнопка в карточке предмета, без факультета группы не формируются
+        skipped = [subject for subject in subjects if subject.faculty_id is None]
+        subjects = [subject for subject in subjects if subject.faculty_id is not None]
+
+        started = time.perf_counter()
+        results = generate_subject_groups(subjects, workers=options['workers'])
+        elapsed = time.perf_counter() - started
+
+        for subject in subjects:
+            result = results[subject.pk]
+            self.stdout.write(
+                f'{subject}: создано групп {result["created"]}, добавлено студентов {result["added"]}, '
+                f'расчет {result["seconds"] * 1000:.1f} мс'
+            )
+        for subject in skipped:
+            self.stdout.write(self.style.WARNING(f'{subject}: не указан факультет, пропущен'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Предметов: {len(subjects)}, создано групп {sum(r["created"] for r in results.values())}, '
+            f'добавлено студентов {sum(r["added"] for r in results.values())}, всего {elapsed:.2f} с'
+        ))
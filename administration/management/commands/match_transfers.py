@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from administration.enums import Status
+from administration.matching import is_cycle, match_subject
+from administration.models import Subject
+
+
+class Command(BaseCommand):
+    help = 'Выполнить обмены и цепочки переводов по заявкам в очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', type=int, action='append', dest='subjects',
+                            help='pk предмета, можно указать несколько раз')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='только показать найденные обмены')
+
+    def handle(self, *args, **options):
+        subjects = Subject.objects.filter(transfer_requests__status=Status.PENDING).distinct()
+        if options['subjects']:
+            subjects = subjects.filter(pk__in=options['subjects'])
+
+        for subject in subjects:
+            started = time.perf_counter()
+            exchanges = match_subject(subject, dry_run=options['dry_run'])
+            elapsed = time.perf_counter() - started
+
+            cycles = sum(1 for exchange in exchanges if is_cycle(exchange))
+            moved = sum(len(exchange) for exchange in exchanges)
+            self.stdout.write(
+                f'{subject}: циклов {cycles}, цепочек {len(exchanges) - cycles}, '
+                f'заявок {moved}, {elapsed:.2f} с'
+            )
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from administration.models import ChangeLog, FieldChangeLog
+
+# Строки одного сохранения создавались подряд, их время отличается на доли секунды
+SAME_SAVE_WINDOW = timedelta(seconds=1)
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Перенести историю изменений из построчного FieldChangeLog в ChangeLog'
+
+    def handle(self, *args, **options):
+        logs = (
+            FieldChangeLog.objects
+            .order_by('content_type_id', 'object_id', 'timestamp', 'pk')
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+
+        created = converted = 0
+        batch, converted_pks = [], []
+        current = None
+        last_timestamp = None
+
+        def flush():
+            nonlocal created, converted, batch, converted_pks
+            with transaction.atomic():
+                ChangeLog.objects.bulk_create(batch)
+                FieldChangeLog.objects.filter(pk__in=converted_pks).delete()
+            created += len(batch)
+            converted += len(converted_pks)
+            batch, converted_pks = [], []
+
+        for log in logs:
+            key = (log.content_type_id, log.object_id, log.modifier_content_type_id, log.modifier_object_id)
+            same_save = (
+                current is not None
+                and key == current[0]
+                and log.timestamp - last_timestamp <= SAME_SAVE_WINDOW
+                and log.field_name not in current[1].changes
+            )
+
+            if not same_save:
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+
+                current = (key, ChangeLog(
+                    content_type_id=log.content_type_id,
+                    object_id=log.object_id,
+                    changes={},
+                    modifier_content_type_id=log.modifier_content_type_id,
+                    modifier_object_id=log.modifier_object_id,
+                    timestamp=log.timestamp,
+                ))
+                batch.append(current[1])
+
+            current[1].changes[log.field_name] = [log.old_value, log.new_value]
+            converted_pks.append(log.pk)
+            last_timestamp = log.timestamp
+
+        if batch:
+            flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено строк: {converted}, создано записей истории: {created}'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from administration import cache_versions
+from administration.models import SubjectGroup
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать число студентов во всех предметных группах'
+
+    def handle(self, *args, **options):
+        updated = SubjectGroup.recount_students()
+        cache_versions.bump_all()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано предметных групп: {updated}'))
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from administration.enums import JobStatus
+from administration.imports import run_import_job
+from administration.models import ImportJob
+
+
+# Сколько задание может не сообщать о прогрессе, прежде чем его обработчик считается умершим.
+# Прогресс сохраняется после каждого куска файла, кусок обрабатывается за секунды
+STALE_TIMEOUT = timedelta(minutes=30)
+
+
+class Command(BaseCommand):
+    help = 'Выполнить задания импорта из файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('jobs', nargs='*', type=int,
+                            help='pk заданий; без аргументов — все задания в ожидании')
+
+    def handle(self, *args, **options):
+        stale = ImportJob.fail_stale(STALE_TIMEOUT)
+        if stale:
+            self.stderr.write(f'Помечено упавшими зависших заданий: {stale}')
+
+        pks = options['jobs'] or list(
+            ImportJob.objects.filter(status=JobStatus.PENDING).order_by('pk').values_list('pk', flat=True)
+        )
+
+        for pk in pks:
+            if not ImportJob.claim(pk):
+                continue
+
+            job = ImportJob.objects.get(pk=pk)
+            run_import_job(job)
+
+            self.stdout.write(
+                f'{job}: {job.get_status_display()}, строк {job.rows_processed}, '
+                f'{job.rows_per_second} строк/с, создано {job.created}, обновлено {job.updated}, '
+                f'пропущено {job.skipped}'
+            )
+            for error in job.errors:
+                self.stderr.write(error)
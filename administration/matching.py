@@ -0,0 +1,175 @@
+from collections import defaultdict, deque
+from contextlib import nullcontext
+
+from django.db import transaction
+from django.utils import timezone
+
+from .enums import Status
+from .models import SubjectGroup, TransferRequest, complete_requests
+
+
+def _find_path(edges, start, is_target):
+    # Кратчайший путь от start до группы, подходящей под is_target: пары (из группы, в группу),
+    # [] если подходит сама start, None если пути нет
+    if is_target(start):
+        return []
+
+    parents = {start: None}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for nxt in edges.get(node, ()):
+            if nxt in parents:
+                continue
+
+            parents[nxt] = node
+            if is_target(nxt):
+                path = []
+                while nxt != start:
+                    path.append((parents[nxt], nxt))
+                    nxt = parents[nxt]
+                return path[::-1]
+
+            queue.append(nxt)
+
+    return None
+
+
+def find_exchanges(requests, groups):
+    # Циклы и цепочки переводов среди заявок одного предмета (в порядке очереди), каждый обмен —
+    # список заявок в порядке выполнения. Цикл не меняет численность групп, цепочка идет
+    # из группы с запасом сверх min_students в группу, где есть место до max_students
+    now = timezone.now()
+
+    # Ребра графа групп: из группы -> в группу -> заявки по порядку подачи
+    edges = defaultdict(dict)
+    eligible = []
+    for req in requests:
+        to_group = groups[req.to_group_id]
+        if req.from_group_id == req.to_group_id:
+            continue
+        if to_group.deadline and now > to_group.deadline:
+            continue
+
+        edges[req.from_group_id].setdefault(req.to_group_id, deque()).append(req)
+        eligible.append(req)
+
+    used = set()
+
+    def take(u, v):
+        queue = edges[u][v]
+        req = queue.popleft()
+        if not queue:
+            del edges[u][v]
+        used.add(req.pk)
+        return req
+
+    exchanges = []
+
+    # Циклы: заявки разбираются по порядку, путь обратно ищется от группы назначения.
+    # Ребра только убывают, поэтому пара групп без цикла больше не проверяется.
+    dead = set()
+    for req in eligible:
+        u, v = req.from_group_id, req.to_group_id
+        if req.pk in used or (u, v) in dead:
+            continue
+
+        path = _find_path(edges, v, lambda node: node == u)
+        if path is None:
+            dead.add((u, v))
+            continue
+
+        exchanges.append([take(u, v)] + [take(a, b) for a, b in path])
+
+    # Цепочки: численность меняется только у первой и последней группы
+    counts = {pk: grp.students_count for pk, grp in groups.items()}
+
+    def has_room(node):
+        return counts[node] < groups[node].max_students
+
+    progress = True
+    while progress:
+        progress = False
+        dead = set()
+        for req in eligible:
+            u, v = req.from_group_id, req.to_group_id
+            if req.pk in used or (u, v) in dead:
+                continue
+
+            if counts[u] <= groups[u].min_students:
+                dead.add((u, v))
+                continue
+
+            # Пустой путь — место есть в самой группе назначения: такую заявку проводит обычная
+            # очередь через согласование, а не подбор обменов
+            path = _find_path(edges, v, has_room)
+            if not path:
+                dead.add((u, v))
+                continue
+
+            chain = [take(u, v)] + [take(a, b) for a, b in path]
+            counts[u] -= 1
+            counts[chain[-1].to_group_id] += 1
+            exchanges.append(chain)
+            progress = True
+
+    return exchanges
+
+
+def load_pending_requests(subject):
+    # Заявки предмета в очереди, которые еще можно выполнить, и их группы
+    requests = list(
+        TransferRequest.objects
+        .filter(subject=subject, status=Status.PENDING)
+        .select_related('student', 'from_group', 'to_group')
+        .order_by('created_at', 'pk')
+    )
+    if not requests:
+        return [], {}
+
+    groups = SubjectGroup.objects.in_bulk(
+        {req.from_group_id for req in requests} | {req.to_group_id for req in requests}
+    )
+
+    members = set(
+        SubjectGroup.students.through.objects
+        .filter(
+            subjectgroup_id__in={req.from_group_id for req in requests},
+            student_id__in={req.student_id for req in requests}
+        )
+        .values_list('subjectgroup_id', 'student_id')
+    )
+
+    # Заявка устарела, если студента уже нет в исходной группе;
+    # из нескольких заявок одного студента учитывается самая ранняя
+    valid = []
+    students = set()
+    for req in requests:
+        if (req.from_group_id, req.student_id) not in members or req.student_id in students:
+            continue
+        students.add(req.student_id)
+        valid.append(req)
+
+    return valid, groups
+
+
+def execute_exchanges(exchanges, modified_by=None):
+    # Все обмены выполняются одной пачкой: очередь пересчитывается только после того, как
+    # применены все перемещения, а не посреди обмена, когда место освободилось временно
+    complete_requests([req for exchange in exchanges for req in exchange], modified_by=modified_by)
+
+
+def match_subject(subject, dry_run=False, modified_by=None):
+    # Очередь читается и обмены выполняются в одной транзакции: между ними состав групп не изменится
+    with nullcontext() if dry_run else transaction.atomic():
+        requests, groups = load_pending_requests(subject)
+        exchanges = find_exchanges(requests, groups)
+
+        if not dry_run:
+            execute_exchanges(exchanges, modified_by=modified_by)
+
+    return exchanges
+
+
+def is_cycle(exchange):
+    return exchange[0].from_group_id == exchange[-1].to_group_id
@@ -1,14 +1,14 @@
-from collections import defaultdict
-
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.db import models, transaction
-from django.db.models import Q
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from .enums import EducationSystem, Sex, Semester, Status
+from . import cache_versions, events
+from .enums import EducationSystem, ImportKind, JobStatus, Sex, Semester, Status
 from .settings import Settings
 from .utils import current_semester, current_year
 
@@ -155,26 +155,13 @@ class Subject(models.Model):
     )
 
     def create_subject_groups(self):
-        qs = Student.objects.all()
-        qs = qs.filter(year=self.course) if self.course is not None else qs
-        if self.faculty is not None:
-            qs = qs.filter(groups__faculty=self.faculty)
-        if self.department is not None:
-            qs = qs.filter(departments=self.department)
-        qs = qs.distinct().prefetch_related('groups')
-
-        groups_map = defaultdict(list)
-        for student in qs:
-            for grp in student.groups.all():
-                if self.faculty and grp.faculty != self.faculty:
-                    continue
-                groups_map[grp].append(student)
+        # Предметная группа заводится на каждую учебную группу (SubjectGroup.group).
+        # Повторный запуск дополняет только недостающее: студенты, уже распределенные по группам предмета,
+        # не добавляются повторно, а группы создаются, только если в них есть кого добавить.
+        from .grouping import generate_subject_groups
 
-        with transaction.atomic():
-            # SubjectGroup.objects.filter(subject=self).delete()  # TODO удалить старые предметные группы?
-            for grp, students in groups_map.items():
-                sg = SubjectGroup.objects.create(subject=self)
-                sg.students.add(*students)
+        result = generate_subject_groups([self])[self.pk]
+        return result['created'], result['added']
 
     def __str__(self):
         return (
@@ -197,6 +184,15 @@ class SubjectGroup(models.Model):
         related_name='subject_groups',
         verbose_name=_('Предмет')
     )
+    # Учебная группа, из которой сформирована предметная группа
+    group = models.ForeignKey(
+        Group,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='subject_groups',
+        verbose_name=_('Учебная группа')
+    )
     teachers = models.ManyToManyField(
         Teacher,
         blank=True,
@@ -210,6 +206,41 @@ class SubjectGroup(models.Model):
     min_students = models.PositiveIntegerField(_('Минимальное число студентов в группе'), default=0)
     max_students = models.PositiveIntegerField(_('Максимальное число студентов в группе'), default=0)
     deadline = models.DateTimeField(_('Крайнее время подачи заявления на перевод'), null=True, blank=True)
+    students_count = models.PositiveIntegerField(_('Число студентов'), default=0, editable=False)
+
+    @classmethod
+    def recount_students(cls, pks=None):
+        # Пересчитать число студентов одним UPDATE по промежуточной таблице
+        counts = (
+            cls.students.through.objects
+            .filter(subjectgroup_id=OuterRef('pk'))
+            .order_by()
+            .values('subjectgroup_id')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+
+        qs = cls.objects.all() if pks is None else cls.objects.filter(pk__in=pks)
+        return qs.update(students_count=Coalesce(Subquery(counts), 0))
+
+    @classmethod
+    def apply_default_capacity(cls, old_min, old_max, new_min, new_max):
+        # Новые значения по умолчанию для групп, оставшихся на прежних, и пересчет их очереди заявок
+        open_groups = cls.objects.filter(Q(deadline__isnull=True) | Q(deadline__gt=timezone.now()))
+
+        pks = set()
+        with transaction.atomic():
+            for field, old, new in (('min_students', old_min, new_min), ('max_students', old_max, new_max)):
+                if old == new:
+                    continue
+                groups = open_groups.filter(**{field: old})
+                pks.update(groups.values_list('pk', flat=True))
+                groups.update(**{field: new})
+
+            if pks:
+                process_pending_requests_for_groups(list(pks))
+
+        return len(pks)
 
     def get_teacher_names(self, default: any = _('--')):
         qs = self.teachers.all()
@@ -226,6 +257,13 @@ class SubjectGroup(models.Model):
             if not self.deadline:
                 self.deadline = admin_settings.default_deadline
 
+        elif kwargs.get('update_fields') is None:
+            # Счетчик студентов ведется сигналами, устаревшее значение из памяти не записываем
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'students_count'
+            ]
+
         super().save(*args, **kwargs)
 
         process_pending_requests_for_groups([self.pk])
@@ -336,57 +374,83 @@ class TransferRequest(models.Model):
     def save(self, *args, **kwargs):
         # Создать уникальный человеко-читаемый код
         if not self.code:
-            today_str = timezone.localtime(self.created_at).strftime('%d%m%Y')
-            prefix = f'{today_str}'
-
-            with transaction.atomic():
-                # Сколько уже записей с таким префиксом?
-                last = (
-                    TransferRequest.objects
-                    .filter(code__startswith=prefix)
-                    .order_by('-code')
-                    .first()
-                )
-                if last is None:
-                    next_num = 1
-                else:
-                    last_seq = int(last.code.split('-')[-1])
-                    next_num = last_seq + 1
-
-                suffix = str(next_num).zfill(4)
-                self.code = f'{prefix}-{suffix}'
-
-        old = None
-        if not self._state.adding:
+            day = timezone.localdate(self.created_at)
+            prefix = day.strftime('%d%m%Y')
+            self.code = f'{prefix}-{TransferRequestCounter.next_value(day):04d}'
+
+        if not self._state.adding and '_loaded_values' not in self.__dict__:
+            # Экземпляр создан не из базы: исходные значения берутся отдельным запросом
             old = self.__class__.objects.filter(pk=self.pk).first()
+            if old:
+                self._loaded_values = old._loaded_values
 
+        changes = self.get_changes() if not self._state.adding else {}
+
+        adding = self._state.adding
         super().save(*args, **kwargs)
 
-        if old:
-            for field in self._meta.get_fields():
-                if not hasattr(field, 'attname') or field.auto_created:
-                    continue
+        if changes:
+            self.make_change_log(changes, getattr(self, '_modified_by', None)).save()
+        if adding or 'status' in changes:
+            events.publish([self])
+
+        self.remember_state()
+
+        old_status, new_status = changes.get('status', (None, None))
+        if new_status == Status.COMPLETED and old_status != Status.COMPLETED:
+            process_pending_requests_for_groups([
+                self.from_group_id,
+                self.to_group_id,
+            ])
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def remember_state(self):
+        self._loaded_values = {
+            f.attname: getattr(self, f.attname)
+            for f in self._meta.concrete_fields
+            if f.attname not in self.get_deferred_fields()
+        }
+
+    def get_changes(self):
+        # Поля, измененные с момента загрузки из базы: {поле: [старое, новое]}
+        changes = {}
+        for name, old_value in self.__dict__.get('_loaded_values', {}).items():
+            if name == self._meta.pk.attname:
+                continue
+
+            new_value = getattr(self, name)
+            if old_value != new_value:
+                changes[name] = [
+                    None if old_value is None else str(old_value),
+                    None if new_value is None else str(new_value),
+                ]
+
+        return changes
+
+    def make_change_log(self, changes, modified_by=None):
+        return ChangeLog(
+            content_type=ContentType.objects.get_for_model(self),
+            object_id=self.pk,
+            changes=changes,
+            modified_by=modified_by,
+        )
 
-                name = field.attname
-                old_val = getattr(old, name)
-                new_val = getattr(self, name)
-                if old_val != new_val:
-                    FieldChangeLog.objects.create(
-                        content_type=ContentType.objects.get_for_model(self),
-                        object_id=self.pk,
-                        field_name=name,
-                        old_value=str(old_val),
-                        new_value=str(new_val),
-                        modified_by=getattr(self, '_modified_by', None),
-                    )
-
-            old_status = getattr(old, 'status')
-            new_status = getattr(self, 'status')
-            if new_status == Status.COMPLETED and old_status != Status.COMPLETED:
-                process_pending_requests_for_groups([
-                    self.from_group_id,
-                    self.to_group_id,
-                ])
+    # Записать изменения нескольких заявок одним bulk_create, например после QuerySet.update()
+    @classmethod
+    def log_changes(cls, requests, modified_by=None):
+        logs = []
+        for req in requests:
+            changes = req.get_changes()
+            if changes:
+                logs.append(req.make_change_log(changes, modified_by))
+            req.remember_state()
+
+        return ChangeLog.objects.bulk_create(logs)
 
     def clean(self):
         super().clean()
@@ -397,6 +461,85 @@ class TransferRequest(models.Model):
         return f'{self.student.full_name}: {self.from_group} → {self.to_group}'
 
 
+class TransferRequestCounter(models.Model):
+    class Meta:
+        verbose_name = _('Счетчик заявок за день')
+        verbose_name_plural = _('Счетчики заявок за день')
+
+    day = models.DateField(_('День'), unique=True)
+    value = models.PositiveIntegerField(_('Последний номер'), default=0)
+
+    @classmethod
+    def next_value(cls, day):
+        with transaction.atomic():
+            # UPDATE сразу берет блокировку на запись, параллельные заявки ждут своей очереди
+            if cls.objects.filter(day=day).update(value=F('value') + 1):
+                return cls.objects.filter(day=day).values_list('value', flat=True).get()
+
+            # Первая заявка за день: продолжаем нумерацию заявок, созданных до появления счетчика
+            codes = (
+                TransferRequest.objects
+                .filter(code__startswith=day.strftime('%d%m%Y'))
+                .values_list('code', flat=True)
+            )
+            start = max((int(code.split('-')[-1]) for code in codes), default=0)
+
+            try:
+                with transaction.atomic():
+                    cls.objects.create(day=day, value=start + 1)
+                return start + 1
+            except IntegrityError:
+                cls.objects.filter(day=day).update(value=F('value') + 1)
+                return cls.objects.filter(day=day).values_list('value', flat=True).get()
+
+
+class ChangeLog(models.Model):
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+        ]
+
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        related_name='change_logs'
+    )
+    object_id = models.PositiveIntegerField()
+    # {поле: [старое значение, новое значение]}
+    changes = models.JSONField(default=dict)
+    modifier_content_type = models.ForeignKey(
+        ContentType,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='change_logs_modifier'
+    )
+    modifier_object_id = models.PositiveIntegerField(null=True, blank=True)
+    modified_by = GenericForeignKey('modifier_content_type', 'modifier_object_id')
+    timestamp = models.DateTimeField(default=timezone.now)
+
+
+# Смена статуса заявки для подписчиков SSE; через таблицу события доходят до всех процессов, см. events.py
+class TransferEvent(models.Model):
+    class Meta:
+        ordering = ['pk']
+        indexes = [
+            models.Index(fields=['channel', 'id']),
+        ]
+
+    request = models.ForeignKey(
+        TransferRequest,
+        on_delete=models.CASCADE,
+        related_name='events'
+    )
+    status = models.CharField(choices=Status.choices)
+    # Кому событие адресовано: 'student:<pk>' или 'teacher:<pk>', строка на каждого адресата
+    channel = models.CharField(max_length=50)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+# Устаревший формат истории: строка на каждое поле, переносится в ChangeLog командой migrate_change_logs
 class FieldChangeLog(models.Model):
     class Meta:
         ordering = ['-timestamp']
@@ -422,15 +565,91 @@ class FieldChangeLog(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
 
 
+class ImportJob(models.Model):
+    class Meta:
+        verbose_name = _('Импорт из файла')
+        verbose_name_plural = _('Импорты из файлов')
+        ordering = ['-created_at']
+
+    kind = models.CharField(_('Что импортируется'), choices=ImportKind)
+    file = models.FileField(_('Файл'), upload_to='imports/%Y/%m/')
+    status = models.CharField(_('Статус'), choices=JobStatus, default=JobStatus.PENDING)
+    rows_processed = models.PositiveIntegerField(_('Обработано строк'), default=0)
+    created = models.PositiveIntegerField(_('Создано'), default=0)
+    updated = models.PositiveIntegerField(_('Обновлено'), default=0)
+    skipped = models.PositiveIntegerField(_('Пропущено'), default=0)
+    errors = models.JSONField(_('Ошибки'), default=list, blank=True)
+    # Пробный прогон сохраняет изменения в diff, применить их можно позже без повторного разбора файла
+    dry_run = models.BooleanField(_('Пробный прогон'), default=False)
+    diff = models.JSONField(_('Изменения'), null=True, blank=True)
+    remove_memberships = models.BooleanField(_('Исключать из групп и с кафедр'), default=False)
+    created_at = models.DateTimeField(_('Загружен'), auto_now_add=True)
+    started_at = models.DateTimeField(_('Начат'), null=True, blank=True)
+    # Обновляется после каждого куска файла, по нему находятся задания упавших обработчиков
+    progress_at = models.DateTimeField(_('Последний прогресс'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('Завершен'), null=True, blank=True)
+
+    @property
+    def is_finished(self):
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at:
+            return 0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_processed / elapsed) if elapsed > 0 else 0
+
+    @property
+    def can_apply(self):
+        return self.dry_run and self.status == JobStatus.DONE
+
+    @classmethod
+    def schedule_apply(cls, pk, remove_memberships=False):
+        # Пробный прогон становится заданием на применение своего diff
+        return bool(cls.objects.filter(pk=pk, dry_run=True, status=JobStatus.DONE).update(
+            dry_run=False,
+            remove_memberships=remove_memberships,
+            status=JobStatus.PENDING,
+            started_at=None,
+            progress_at=None,
+            finished_at=None
+        ))
+
+    @classmethod
+    def claim(cls, pk):
+        # Задание берет ровно один обработчик: UPDATE проходит только для задания в ожидании
+        now = timezone.now()
+        return bool(cls.objects.filter(pk=pk, status=JobStatus.PENDING).update(
+            status=JobStatus.RUNNING,
+            started_at=now,
+            progress_at=now
+        ))
+
+    @classmethod
+    def fail_stale(cls, timeout):
+        # Обработчик запускается через Popen, и если он умер посреди задания, статус так и
+        # останется RUNNING: задание без прогресса дольше timeout считается упавшим
+        now = timezone.now()
+        return cls.objects.filter(status=JobStatus.RUNNING, progress_at__lt=now - timeout).update(
+            status=JobStatus.FAILED,
+            errors=['Обработчик задания перестал отвечать'],
+            finished_at=now
+        )
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.file.name.rsplit("/", 1)[-1]}'
+
+
 def evaluate_conditions(from_group: SubjectGroup, to_group: SubjectGroup):
     errors = []
 
     # в from_group после ухода студента не меньше min_students
-    if from_group.students.count() <= from_group.min_students:
+    if from_group.students_count <= from_group.min_students:
         errors.append(f'в группе не может стать меньше {from_group.min_students} студентов')
 
     # в to_group не больше max_students
-    if to_group.students.count() >= to_group.max_students:
+    if to_group.students_count >= to_group.max_students:
         errors.append(f'в группе не может быть больше {to_group.max_students} студентов')
 
     # дедлайн подачи не истек
@@ -441,14 +660,103 @@ def evaluate_conditions(from_group: SubjectGroup, to_group: SubjectGroup):
 
 
 def process_pending_requests_for_groups(group_ids: list[int]):
-    pending_qs = TransferRequest.objects.filter(
-        status=Status.PENDING
-    ).filter(
-        Q(from_group_id__in=group_ids) | Q(to_group_id__in=group_ids)
+    pending = list(
+        TransferRequest.objects
+        .filter(status=Status.PENDING)
+        .filter(Q(from_group_id__in=group_ids) | Q(to_group_id__in=group_ids))
+        .order_by('created_at', 'pk')
+    )
+    if not pending:
+        return []
+
+    # Заполненность всех затронутых групп загружается один раз и дальше ведется в памяти
+    groups = SubjectGroup.objects.in_bulk(
+        {req.from_group_id for req in pending} | {req.to_group_id for req in pending}
     )
 
-    for req in pending_qs.select_related('student', 'from_group', 'to_group'):
-        errors = evaluate_conditions(req.from_group, req.to_group)
-        if not errors:
+    promoted = []
+    for req in pending:
+        from_group = groups[req.from_group_id]
+        to_group = groups[req.to_group_id]
+
+        if evaluate_conditions(from_group, to_group):
+            continue
+
+        # Место в to_group занято заявкой, следующие заявки очереди это учитывают
+        from_group.students_count -= 1
+        to_group.students_count += 1
+        promoted.append(req)
+
+    if not promoted:
+        return []
+
+    with transaction.atomic():
+        TransferRequest.objects.filter(
+            pk__in=[req.pk for req in promoted],
+            status=Status.PENDING
+        ).update(status=Status.WAITING_TEACHER)
+
+        for req in promoted:
             req.status = Status.WAITING_TEACHER
-            req.save()
+        TransferRequest.log_changes(promoted)
+
+        # QuerySet.update() не вызывает post_save, версии для кэша страниц и события меняются явно
+        cache_versions.bump(
+            students=[req.student_id for req in promoted],
+            groups=[pk for req in promoted for pk in (req.from_group_id, req.to_group_id)]
+        )
+        events.publish(promoted)
+
+    return promoted
+
+
+def complete_requests(requests, modified_by=None):
+    # Выполнить заявки пачкой: перемещения студентов, статусы и история пишутся
+    # массовыми запросами, очередь пересчитывается один раз для всех затронутых групп.
+    # Возвращает выполненные заявки и список (заявка, причина) для пропущенных.
+    completed, failures = [], []
+    seen = set()
+
+    for req in requests:
+        if req.status == Status.COMPLETED:
+            failures.append((req, _('заявка уже выполнена')))
+        elif (req.student_id, req.subject_id) in seen:
+            failures.append((req, _('в выборке уже есть заявка этого студента по этому предмету')))
+        else:
+            seen.add((req.student_id, req.subject_id))
+            completed.append(req)
+
+    if not completed:
+        return completed, failures
+
+    through = SubjectGroup.students.through
+    moves = [req for req in completed if req.from_group_id != req.to_group_id]
+    group_ids = {req.from_group_id for req in completed} | {req.to_group_id for req in completed}
+
+    with transaction.atomic():
+        for i in range(0, len(moves), 300):
+            q = Q()
+            for req in moves[i:i + 300]:
+                q |= Q(subjectgroup_id=req.from_group_id, student_id=req.student_id)
+            through.objects.filter(q).delete()
+
+        through.objects.bulk_create(
+            [through(subjectgroup_id=req.to_group_id, student_id=req.student_id) for req in moves],
+            ignore_conflicts=True
+        )
+        SubjectGroup.recount_students(group_ids)
+
+        TransferRequest.objects.filter(
+            pk__in=[req.pk for req in completed]
+        ).update(status=Status.COMPLETED)
+
+        for req in completed:
+            req.status = Status.COMPLETED
+        TransferRequest.log_changes(completed, modified_by)
+
+        cache_versions.bump_groups(group_ids, students=[req.student_id for req in completed])
+        events.publish(completed)
+
+        process_pending_requests_for_groups(list(group_ids))
+
+    return completed, failures
@@ -0,0 +1,149 @@
+import zipfile
+from datetime import datetime
+from xml.sax import make_parser
+from xml.sax.handler import ContentHandler, feature_namespaces
+
+OFFICE_NS = 'urn:oasis:names:tc:opendocument:xmlns:office:1.0'
+TABLE_NS = 'urn:oasis:names:tc:opendocument:xmlns:table:1.0'
+TEXT_NS = 'urn:oasis:names:tc:opendocument:xmlns:text:1.0'
+
+READ_SIZE = 64 * 1024
+
+
+class SheetHandler(ContentHandler):
+    # SAX-разбор первого листа content.xml. Готовые строки копятся в rows, читатель их забирает.
+    # Значения приводятся к тем же типам, что отдает pandas: None, str, int/float, bool, datetime.
+    # Пустые строки и ячейки в конце отбрасываются, повторы (number-*-repeated) разворачиваются.
+
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.sheets = 0
+        self.in_sheet = False
+        self.row = None
+        self.row_repeat = 1
+        self.empty_rows = 0
+        self.empty_cells = 0
+        self.cell = None
+        self.annotation_depth = 0
+
+    def startElementNS(self, name, qname, attrs):
+        ns, tag = name
+
+        if ns == TABLE_NS and tag == 'table':
+            self.sheets += 1
+            self.in_sheet = self.sheets == 1
+        elif not self.in_sheet:
+            return
+        elif ns == TABLE_NS and tag == 'table-row':
+            self.row = []
+            self.empty_cells = 0
+            self.row_repeat = int(attrs.get((TABLE_NS, 'number-rows-repeated'), 1))
+        elif ns == TABLE_NS and tag in ('table-cell', 'covered-table-cell'):
+            self.cell = {
+                'covered': tag == 'covered-table-cell',
+                'type': attrs.get((OFFICE_NS, 'value-type')),
+                'value': attrs.get((OFFICE_NS, 'value')),
+                'date': attrs.get((OFFICE_NS, 'date-value')),
+                'repeat': int(attrs.get((TABLE_NS, 'number-columns-repeated'), 1)),
+                'text': [],
+            }
+        elif ns == OFFICE_NS and tag == 'annotation':
+            self.annotation_depth += 1
+        elif ns == TEXT_NS and tag == 's' and self.cell is not None and not self.annotation_depth:
+            self.cell['text'].append(' ' * int(attrs.get((TEXT_NS, 'c'), 1)))
+
+    def characters(self, content):
+        if self.cell is not None and not self.annotation_depth:
+            self.cell['text'].append(content.strip('\n'))
+
+    def endElementNS(self, name, qname):
+        ns, tag = name
+        if not self.in_sheet:
+            return
+
+        if ns == TABLE_NS and tag == 'table':
+            self.in_sheet = False
+        elif ns == OFFICE_NS and tag == 'annotation':
+            self.annotation_depth -= 1
+        elif ns == TABLE_NS and tag in ('table-cell', 'covered-table-cell'):
+            value = None if self.cell['covered'] else self.cell_value(self.cell)
+            if value is None:
+                self.empty_cells += self.cell['repeat']
+            else:
+                self.row.extend([None] * self.empty_cells + [value] * self.cell['repeat'])
+                self.empty_cells = 0
+            self.cell = None
+        elif ns == TABLE_NS and tag == 'table-row':
+            if not self.row:
+                self.empty_rows += self.row_repeat
+            else:
+                self.rows.extend([] for _ in range(self.empty_rows))
+                self.rows.extend(list(self.row) for _ in range(self.row_repeat))
+                self.empty_rows = 0
+            self.row = None
+
+    @staticmethod
+    def cell_value(cell):
+        value_type = cell['type']
+        if value_type is None:
+            return None
+        if value_type == 'boolean':
+            return ''.join(cell['text']) == 'TRUE'
+        if value_type == 'float':
+            value = float(cell['value'])
+            return int(value) if value.is_integer() else value
+        if value_type in ('percentage', 'currency'):
+            return float(cell['value'])
+        if value_type == 'date':
+            return datetime.fromisoformat(cell['date'])
+
+        return ''.join(cell['text']) or None
+
+
+def iter_ods_rows(file_obj):
+    # Строки первого листа по мере чтения content.xml из архива: в памяти только текущий кусок файла
+    handler = SheetHandler()
+    parser = make_parser()
+    parser.setFeature(feature_namespaces, True)
+    parser.setContentHandler(handler)
+
+    with zipfile.ZipFile(file_obj) as archive, archive.open('content.xml') as content:
+        while chunk := content.read(READ_SIZE):
+            parser.feed(chunk)
+            yield from handler.rows
+            handler.rows = []
+
+            # Первый лист прочитан, остальную часть файла можно не разбирать
+            if handler.sheets and not handler.in_sheet:
+                return
+
+        parser.close()
+
+    yield from handler.rows
+
+
+def iter_ods_chunks(file_obj, marker, chunk_size):
+    # Строкой заголовка считается первая строка, где есть marker.
+    # Возвращает пары (заголовок, строки под ним) кусками по chunk_size строк.
+    rows = iter_ods_rows(file_obj)
+
+    header = None
+    for row in rows:
+        values = ['' if v is None else str(v).strip() for v in row]
+        if marker in values:
+            header = values
+            break
+
+    if header is None:
+        raise ValueError('Не найдена строка с заголовками.')
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield header, chunk
+            chunk = []
+
+    if chunk:
+        yield header, chunk
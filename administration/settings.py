@@ -1,5 +1,8 @@
+import time
 from datetime import datetime
+from uuid import uuid4
 
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -10,6 +13,14 @@ class Settings(models.Model):
         verbose_name = _('Глобальные настройки')
         verbose_name_plural = _('Глобальные настройки')
 
+    # Метка версии в общем кэше: меняется при каждом сохранении настроек
+    VERSION_CACHE_KEY = 'administration:settings:version'
+    # Сколько секунд процесс не сверяет метку с кэшем: чтение файлового кэша — открытие файла
+    # на каждый вызов load(), а изменения настроек из других процессов видны с такой задержкой
+    VERSION_CHECK_INTERVAL = 5
+    # (метка версии, экземпляр, время сверки по time.monotonic()), загруженные в этом процессе
+    _cached = (None, None, None)
+
     @staticmethod
     def get_default_deadline():
         tz = timezone.get_current_timezone()
@@ -36,8 +47,28 @@ class Settings(models.Model):
 
     @classmethod
     def load(cls):
-        obj, created = cls.objects.get_or_create(pk=1)
+        # Экземпляр хранится в памяти процесса, пока метка версии в общем кэше не изменилась.
+        # Возвращается общий экземпляр, изменять его нельзя
+        cached_version, obj, checked_at = cls._cached
+        now = time.monotonic()
+        if obj is not None and now - checked_at < cls.VERSION_CHECK_INTERVAL:
+            return obj
+
+        version = cache.get(cls.VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(cls.VERSION_CACHE_KEY, uuid4().hex, None)
+            version = cache.get(cls.VERSION_CACHE_KEY)
+
+        if obj is None or cached_version != version:
+            obj, created = cls.objects.get_or_create(pk=1)
+        cls._cached = (version, obj, now)
         return obj
 
+    @classmethod
+    def invalidate_cache(cls):
+        # Новая метка заставляет все процессы перечитать настройки при следующем load()
+        cls._cached = (None, None, None)
+        cache.set(cls.VERSION_CACHE_KEY, uuid4().hex, None)
+
     def __str__(self):
         return str(_('Глобальные настройки'))
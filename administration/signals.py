@@ -2,10 +2,15 @@ from django.apps import apps
 from django.conf import settings
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete, pre_delete
 from django.db.models.signals import post_migrate
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from . import cache_versions
+from .models import Settings, Student, Subject, SubjectGroup, Teacher, TransferRequest
 from .staff import StaffProfile
 
 
@@ -15,6 +20,12 @@ def create_staff_profile(sender, instance, created, **kwargs):
         StaffProfile.objects.create(user=instance)
 
 
+@receiver(post_save, sender=Settings)
+def invalidate_settings_cache(sender, instance, **kwargs):
+    # После фиксации транзакции, чтобы другие процессы не перечитали старые значения
+    transaction.on_commit(Settings.invalidate_cache)
+
+
 @receiver(post_migrate)
 def create_default_settings(sender, **kwargs):
     if sender.name != 'administration':
@@ -28,3 +39,92 @@ def create_default_settings(sender, **kwargs):
 
     Settings = apps.get_model('administration', 'Settings')
     Settings.objects.get_or_create(pk=1)
+
+
+@receiver(m2m_changed, sender=SubjectGroup.students.through)
+def update_students_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # После очистки со стороны студента группы уже не найти
+        instance._cleared_subject_group_pks = list(
+            instance.subjectgroup_set.values_list('pk', flat=True)
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        pks = [instance.pk]
+    elif action == 'post_clear':
+        pks = instance.__dict__.pop('_cleared_subject_group_pks', [])
+    else:
+        pks = pk_set
+
+    if pks:
+        SubjectGroup.recount_students(pks)
+        # У добавленных студентов появляется новый предмет, у остальных меняется версия предмета
+        added = (pk_set or ()) if action == 'post_add' and not reverse else ()
+        cache_versions.bump_groups(pks, students=[instance.pk] if reverse else added)
+
+
+@receiver(m2m_changed, sender=SubjectGroup.teachers.through)
+def bump_teachers_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_teacher_group_pks = list(
+            instance.subjectgroup_set.values_list('pk', flat=True)
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        cache_versions.bump_groups([instance.pk], teachers=pk_set or ())
+    elif action == 'post_clear':
+        cache_versions.bump_groups(instance.__dict__.pop('_cleared_teacher_group_pks', []), teachers=[instance.pk])
+    else:
+        cache_versions.bump_groups(pk_set, teachers=[instance.pk])
+
+
+@receiver(post_save, sender=TransferRequest)
+@receiver(post_delete, sender=TransferRequest)
+def bump_transfer_request_versions(sender, instance, **kwargs):
+    cache_versions.bump(students=[instance.student_id], groups=[instance.from_group_id, instance.to_group_id])
+
+
+@receiver(post_save, sender=SubjectGroup)
+@receiver(post_delete, sender=SubjectGroup)
+def bump_subject_group_versions(sender, instance, **kwargs):
+    cache_versions.bump(groups=[instance.pk], subjects=[instance.subject_id])
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def bump_subject_versions(sender, instance, **kwargs):
+    cache_versions.bump(subjects=[instance.pk])
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def bump_student_versions(sender, instance, **kwargs):
+    # Имя студента показывается и в кабинетах преподавателей его групп
+    cache_versions.bump_groups(instance.subjectgroup_set.values_list('pk', flat=True), students=[instance.pk])
+
+
+@receiver(post_save, sender=Teacher)
+@receiver(post_delete, sender=Teacher)
+def bump_teacher_versions(sender, instance, **kwargs):
+    cache_versions.bump_groups(instance.subjectgroup_set.values_list('pk', flat=True), teachers=[instance.pk])
+
+
+@receiver(pre_delete, sender=Student)
+def remember_student_subject_groups(sender, instance, **kwargs):
+    instance._subject_group_pks = list(instance.subjectgroup_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Student)
+def recount_student_subject_groups(sender, instance, **kwargs):
+    pks = instance.__dict__.pop('_subject_group_pks', None)
+    if pks:
+        SubjectGroup.recount_students(pks)
+        cache_versions.bump_groups(pks)
@@ -0,0 +1,137 @@
+from datetime import date, datetime, timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.utils import timezone
+
+from .enums import Status
+from .matching import match_subject
+from .models import (
+    ChangeLog, Faculty, Student, Subject, SubjectGroup, TransferRequest, TransferRequestCounter
+)
+
+
+class MatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Subject.objects.create(name='Предмет', course=1, faculty=Faculty.objects.create(name='ФПМИ'))
+        cls.student_number = 0
+
+    def add_group(self, students, min_students, max_students):
+        group = SubjectGroup.objects.create(
+            subject=self.subject, min_students=min_students, max_students=max_students,
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        members = [self.add_student() for _ in range(students)]
+        group.students.add(*members)
+        return group, members
+
+    def add_student(self):
+        self.student_number += 1
+        return Student.objects.create(
+            full_name=f'Студент {self.student_number}', year=1, sex='M', birthdate=date(2000, 1, 1),
+            email=f's{self.student_number}@phystech.edu'
+        )
+
+    def add_request(self, student, from_group, to_group):
+        return TransferRequest.objects.create(
+            student=student, subject=self.subject, from_group=from_group, to_group=to_group,
+            reason='Причина', status=Status.PENDING
+        )
+
+    def status_logs(self, req):
+        return list(
+            ChangeLog.objects
+            .filter(content_type=ContentType.objects.get_for_model(TransferRequest), object_id=req.pk)
+            .values_list('changes__status', flat=True)
+        )
+
+    def test_swap_does_not_promote_queue_mid_exchange(self):
+        # Нулевые границы заменяются значениями по умолчанию из Settings, поэтому min_students=1
+        a, (student_a, _) = self.add_group(students=2, min_students=1, max_students=2)
+        b, (student_b, _) = self.add_group(students=2, min_students=1, max_students=2)
+        c, (student_c, _) = self.add_group(students=2, min_students=1, max_students=3)
+
+        # Заявка в полную группу A подана раньше обмена и должна остаться в очереди
+        waiting = self.add_request(student_c, c, a)
+        first = self.add_request(student_a, a, b)
+        second = self.add_request(student_b, b, a)
+
+        exchanges = match_subject(self.subject)
+
+        self.assertEqual([[req.pk for req in exchange] for exchange in exchanges], [[first.pk, second.pk]])
+        for req in (first, second):
+            req.refresh_from_db()
+            self.assertEqual(req.status, Status.COMPLETED)
+            self.assertEqual(self.status_logs(req), [[Status.PENDING, Status.COMPLETED]])
+
+        waiting.refresh_from_db()
+        self.assertEqual(waiting.status, Status.PENDING)
+        self.assertEqual(
+            list(SubjectGroup.objects.order_by('pk').values_list('students_count', flat=True)), [2, 2, 2]
+        )
+        self.assertTrue(b.students.filter(pk=student_a.pk).exists())
+        self.assertTrue(a.students.filter(pk=student_b.pk).exists())
+
+    def test_lone_feasible_request_is_not_completed(self):
+        a, (student, *_) = self.add_group(students=3, min_students=1, max_students=3)
+        b, _ = self.add_group(students=1, min_students=1, max_students=3)
+        req = self.add_request(student, a, b)
+
+        exchanges = match_subject(self.subject)
+
+        self.assertEqual(exchanges, [])
+        req.refresh_from_db()
+        self.assertNotEqual(req.status, Status.COMPLETED)
+        self.assertTrue(a.students.filter(pk=student.pk).exists())
+
+class TransferRequestCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.faculty = Faculty.objects.create(name='ФПМИ')
+
+    def setUp(self):
+        self.day = date(2026, 9, 1)
+
+    def make_code(self, value):
+        return f'{self.day.strftime("%d%m%Y")}-{value:04d}'
+
+    def create_request(self, number, code=''):
+        # Заявка за self.day; с пустым code номер выдает счетчик
+        subject = Subject.objects.create(name=f'Предмет {number}', course=1, faculty=self.faculty)
+        group = SubjectGroup.objects.create(subject=subject, max_students=30)
+        student = Student.objects.create(
+            full_name=f'Студент {number}', year=1, sex='M', birthdate=date(2000, 1, 1),
+            email=f's{number}@phystech.edu'
+        )
+        return TransferRequest.objects.create(
+            student=student, subject=subject, from_group=group, to_group=group, reason='Причина', code=code,
+            created_at=timezone.make_aware(datetime(self.day.year, self.day.month, self.day.day, 12))
+        )
+
+    def test_sequential_codes_per_day(self):
+        self.assertEqual([TransferRequestCounter.next_value(self.day) for _ in range(3)], [1, 2, 3])
+        # У другого дня своя нумерация
+        self.assertEqual(TransferRequestCounter.next_value(date(2026, 9, 2)), 1)
+        self.assertEqual(TransferRequestCounter.next_value(self.day), 4)
+
+    def test_overflow_past_9999(self):
+        TransferRequestCounter.objects.create(day=self.day, value=9998)
+
+        codes = [self.make_code(TransferRequestCounter.next_value(self.day)) for _ in range(3)]
+
+        self.assertEqual(codes, ['01092026-9999', '01092026-10000', '01092026-10001'])
+
+    def test_request_codes_continue_after_overflow(self):
+        TransferRequestCounter.objects.create(day=self.day, value=9999)
+
+        codes = [self.create_request(i).code for i in range(2)]
+
+        self.assertEqual(codes, ['01092026-10000', '01092026-10001'])
+
+    def test_first_code_of_day_continues_existing_codes_numerically(self):
+        # Заявки, созданные до появления счетчика: '10000' меньше '9999' как строка, но не как число
+        self.create_request(1, code='01092026-9999')
+        self.create_request(2, code='01092026-10000')
+
+        self.assertEqual(self.create_request(3).code, '01092026-10001')
@@ -0,0 +1,122 @@
+"""
+Пиковая память и время чтения ODS-реестра студентов потоковым читателем
+administration.ods в зависимости от размера файла.
+
+Запуск из корня проекта:
+
+    python benchmarks/ods_import_memory.py --rows 10000 50000 200000
+
+Файлы генерируются во временном каталоге. Память меряется через tracemalloc (время
+под ним завышено в несколько раз, сравнивать стоит только между собой) и при
+потоковом чтении не должна расти вместе с числом строк. Если установлен odfpy,
+для сравнения печатается то же для pd.read_excel(engine='odf'), которым файл
+читался целиком до перехода на потоковый разбор.
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from administration.ods import iter_ods_chunks  # noqa: E402
+
+HEADER = ('Студент', 'Группа', 'Кафедра', 'Курс', 'Пол', 'Дата рождения', 'Адрес электронной почты физтех')
+
+CONTENT_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<office:document-content'
+    ' xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"'
+    ' xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"'
+    ' xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"'
+    ' office:version="1.2">'
+    '<office:body><office:spreadsheet><table:table table:name="Лист1">'
+)
+CONTENT_TAIL = '</table:table></office:spreadsheet></office:body></office:document-content>'
+
+MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">'
+    '<manifest:file-entry manifest:full-path="/" manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    '</manifest:manifest>'
+)
+
+
+def xml_row(values):
+    cells = ''.join(
+        f'<table:table-cell office:value-type="string"><text:p>{escape(str(v))}</text:p></table:table-cell>'
+        for v in values
+    )
+    return f'<table:table-row>{cells}</table:table-row>'
+
+
+def write_ods(path, rows):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(zipfile.ZipInfo('mimetype'), 'application/vnd.oasis.opendocument.spreadsheet')
+        archive.writestr('META-INF/manifest.xml', MANIFEST)
+        with archive.open('content.xml', 'w') as content:
+            content.write(CONTENT_HEAD.encode())
+            content.write(xml_row(['Реестр студентов']).encode())
+            content.write(xml_row(HEADER).encode())
+            for i in range(rows):
+                content.write(xml_row((
+                    f'Иванов Иван {i}', f'Б0{i % 60}-00{i % 7}', f'Кафедра {i % 12}', 1 + i % 4,
+                    'Мужской', f'{1 + i % 28:02d}.{1 + i % 12:02d}.2004', f'student{i}@phystech.edu',
+                )).encode())
+            content.write(CONTENT_TAIL.encode())
+
+
+def measure(func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = func()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak / 1024 / 1024
+
+
+def read_streaming(path, chunk_size):
+    rows = 0
+    with open(path, 'rb') as file_obj:
+        for _, chunk in iter_ods_chunks(file_obj, 'Студент', chunk_size):
+            rows += len(chunk)
+    return rows
+
+
+def read_pandas(path):
+    import pandas as pd
+    return len(pd.read_excel(path, engine='odf', header=None)) - 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 200000])
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    compare = importlib.util.find_spec('odf') is not None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.rows:
+            path = os.path.join(tmp, f'students_{n}.ods')
+            write_ods(path, n)
+            size = os.path.getsize(path) / 1024 / 1024
+
+            rows, elapsed, peak = measure(lambda: read_streaming(path, args.chunk_size))
+            print(f'{n:>8} строк ({size:.1f} МБ)  потоково: {elapsed:.2f} с, пик {peak:.1f} МБ, строк {rows}')
+
+            if compare:
+                rows, elapsed, peak = measure(lambda: read_pandas(path))
+                print(f'{"":>8}                 read_excel: {elapsed:.2f} с, пик {peak:.1f} МБ, строк {rows}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Одновременная подача заявок через transfer_view на SQLite: число ошибок
+"database is locked" и задержки ответа (p50/p99) без настройки соединений
+и с профилем SQLITE_PRAGMAS из settings.py (WAL, busy_timeout, synchronous=NORMAL,
+BEGIN IMMEDIATE, постоянные соединения).
+
+Запуск из корня проекта:
+
+    python benchmarks/sqlite_concurrency.py --threads 32 --requests 20
+
+Каждый профиль запускается в отдельном процессе на своей временной копии схемы БД,
+рабочая база не затрагивается. Запросы проходят весь стек Django (сессии в БД,
+middleware, представление), как при работе через сервер приложений.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transfer.settings')
+
+PROFILES = ('stock', 'tuned')
+
+
+def setup_database(path, profile):
+    from django.conf import settings
+
+    database = settings.DATABASES['default']
+    database['NAME'] = path
+    if profile == 'stock':
+        # Настройки Django по умолчанию: журнал DELETE, DEFERRED-транзакции, соединение на запрос
+        database['OPTIONS'] = {}
+        database['CONN_MAX_AGE'] = 0
+        settings.SQLITE_PRAGMAS = {}
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def run_profile(profile, threads, requests):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'concurrency.sqlite3'), profile)
+
+        from django.conf import settings
+        from django.contrib.sessions.backends.db import SessionStore
+        from django.db import OperationalError, connection
+        from django.test import Client
+
+        from administration.models import Faculty, Student, Subject, SubjectGroup, TransferRequest
+
+        faculty = Faculty.objects.create(name='Concurrency')
+        subjects = Subject.objects.bulk_create([
+            Subject(name=f'Subject {i}', course=1, faculty=faculty) for i in range(requests)
+        ])
+        students = Student.objects.bulk_create([
+            Student(full_name=f'Student {i}', year=1, sex='M', birthdate=date(2000, 1, 1), email=f's{i}@bench.ru')
+            for i in range(threads)
+        ])
+        # В каждом предмете все студенты в одной группе и просятся в другую, ограничения не мешают
+        from_groups = SubjectGroup.objects.bulk_create([
+            SubjectGroup(subject=subject, min_students=0, max_students=10 * threads) for subject in subjects
+        ])
+        groups = SubjectGroup.objects.bulk_create([
+            SubjectGroup(subject=subject, min_students=0, max_students=10 * threads) for subject in subjects
+        ])
+        through = SubjectGroup.students.through
+        through.objects.bulk_create([
+            through(subjectgroup_id=group.pk, student_id=student.pk) for group in from_groups for student in students
+        ])
+        SubjectGroup.recount_students([group.pk for group in from_groups])
+
+        session_keys = []
+        for student in students:
+            session = SessionStore()
+            session['student_pk'] = student.pk
+            session.create()
+            session_keys.append(session.session_key)
+        connection.close()
+
+        latencies = []
+        errors = {'locked': 0, 'failed': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def submit(session_key):
+            client = Client()
+            client.cookies[settings.SESSION_COOKIE_NAME] = session_key
+            barrier.wait()
+            try:
+                for subject, group in zip(subjects, groups):
+                    started = time.perf_counter()
+                    try:
+                        response = client.post(
+                            f'/transfer/create/{subject.pk}/',
+                            {'reason': 'bench', 'new_group': group.pk}
+                        )
+                    except OperationalError as e:
+                        with lock:
+                            errors['locked' if 'locked' in str(e) else 'failed'] += 1
+                        continue
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        if response.status_code != 200:
+                            errors['failed'] += 1
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(submit, session_keys))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'profile': profile,
+            'journal_mode': connection.cursor().execute('PRAGMA journal_mode').fetchone()[0],
+            'total': threads * requests,
+            'created': TransferRequest.objects.count(),
+            'locked': errors['locked'],
+            'failed': errors['failed'],
+            'seconds': elapsed,
+            'p50': statistics.median(latencies) * 1000 if latencies else 0,
+            'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=20, help='заявок на поток (по разным предметам)')
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        print(json.dumps(run_profile(args.profile, args.threads, args.requests)))
+        return
+
+    # Профили в отдельных процессах: настройки соединений применяются до django.setup()
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--profile', profile,
+             '--threads', str(args.threads), '--requests', str(args.requests)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f'{result["profile"]:>6} ({result["journal_mode"]}): '
+            f'заявок {result["created"]} из {result["total"]} за {result["seconds"]:.2f} с, '
+            f'database is locked: {result["locked"]}, прочие ошибки: {result["failed"]}, '
+            f'p50 {result["p50"]:.1f} мс, p99 {result["p99"]:.1f} мс'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Нагрузочная проверка выдачи кодов заявок: параллельная подача заявок не должна
+приводить к IntegrityError, а коды за день должны идти подряд без повторов.
+
+Запуск из корня проекта:
+
+    python benchmarks/transfer_code_stress.py --threads 16 --requests 50
+
+Работает на временной копии схемы БД, рабочая база не затрагивается.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transfer.settings')
+
+
+def setup_database(path):
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = path
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='заявок на поток')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_database(os.path.join(tmp, 'stress.sqlite3'))
+
+        from django.db import IntegrityError, OperationalError, connection
+
+        from administration.models import Faculty, Student, Subject, SubjectGroup, TransferRequest
+
+        faculty = Faculty.objects.create(name='Stress')
+        subject = Subject.objects.create(name='Stress', course=1, faculty=faculty)
+        from_group = SubjectGroup.objects.create(subject=subject, min_students=1, max_students=1)
+        to_group = SubjectGroup.objects.create(subject=subject, min_students=1, max_students=1)
+        students = Student.objects.bulk_create([
+            Student(full_name=f'Student {i}', year=1, sex='M', birthdate=date(2000, 1, 1), email=f's{i}@stress.ru')
+            for i in range(args.threads * args.requests)
+        ])
+        connection.close()
+
+        errors = {'integrity': 0, 'locked': 0}
+        lock = threading.Lock()
+
+        def submit(chunk):
+            try:
+                for student in chunk:
+                    try:
+                        TransferRequest.objects.create(
+                            student=student,
+                            subject=subject,
+                            from_group=from_group,
+                            to_group=to_group,
+                            reason='stress'
+                        )
+                    except IntegrityError:
+                        with lock:
+                            errors['integrity'] += 1
+                    except OperationalError:
+                        with lock:
+                            errors['locked'] += 1
+            finally:
+                connection.close()
+
+        chunks = [students[i::args.threads] for i in range(args.threads)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(submit, chunks))
+        elapsed = time.perf_counter() - started
+
+        codes = list(TransferRequest.objects.values_list('code', flat=True))
+        numbers = sorted(int(code.split('-')[-1]) for code in codes)
+
+        print(f'заявок создано: {len(codes)} из {len(students)} за {elapsed:.2f} с')
+        print(f'IntegrityError: {errors["integrity"]}, database is locked: {errors["locked"]}')
+        print(f'коды уникальны: {len(set(codes)) == len(codes)}')
+        print(f'нумерация без пропусков: {numbers == list(range(1, len(numbers) + 1))}')
+
+        if errors['integrity'] or len(set(codes)) != len(codes):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Время холодного старта и резидентная память процесса Django: загрузка приложений,
+админки и URL-конфигурации, как при старте WSGI-воркера или manage.py.
+
+Запуск из корня проекта:
+
+    python benchmarks/worker_startup.py --runs 10
+
+Каждый замер идет в отдельном процессе. Строка «+ pandas» показывает, сколько стоил
+старт, пока pandas импортировался на уровне модуля administration.forms.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = '''
+import json, os, resource, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transfer.settings')
+if {preload_pandas}:
+    import pandas
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'pandas_loaded': 'pandas' in sys.modules,
+}}))
+'''
+
+
+def measure(preload_pandas, runs):
+    results = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD.format(preload_pandas=preload_pandas)],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    for title, preload in (('текущий код', False), ('+ pandas', True)):
+        results = measure(preload, args.runs)
+        seconds = [r['seconds'] for r in results]
+        rss = [r['rss_mb'] for r in results]
+        print(
+            f'{title:12}  старт: медиана {statistics.median(seconds) * 1000:.0f} мс, '
+            f'макс {max(seconds) * 1000:.0f} мс;  RSS: {statistics.median(rss):.1f} МБ;  '
+            f'pandas загружен: {results[0]["pandas_loaded"]}'
+        )
+
+
+if __name__ == '__main__':
+    main()
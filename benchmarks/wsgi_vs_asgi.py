@@ -0,0 +1,349 @@
+"""
+Пропускная способность и задержки портала под WSGI и под ASGI при 200+ одновременных
+клиентах: кабинет студента, подача заявки, страница преподавателя, одобрение и отклонение
+заявок (cabinet_view, transfer_view, teacher_view, approve_transfer, reject_transfer).
+
+Запуск из корня проекта:
+
+    python benchmarks/wsgi_vs_asgi.py --clients 200 --rounds 5 --wsgi-threads 32
+
+Серверы приложений не нужны: запросы подаются прямо в WSGIHandler и ASGIHandler Django,
+со всем стеком middleware, сессиями в БД и CSRF. WSGI-сервер моделируется пулом из
+--wsgi-threads потоков (как gunicorn --threads), остальные клиенты ждут в очереди;
+ASGI — один цикл событий, все клиенты которого обслуживаются одновременно. Задержка
+считается от постановки запроса в очередь до получения ответа. Каждый режим запускается
+в отдельном процессе на своей временной базе и своем файловом кэше, рабочие не затрагиваются.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from urllib.parse import urlencode
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transfer.settings')
+
+MODES = ('wsgi', 'asgi')
+# Групп, в которые можно перевестись, в каждом предмете
+GROUPS_PER_SUBJECT = 5
+
+
+def setup(tmp, mode):
+    # Как точка входа сервера: интерфейс задается до загрузки настроек (от него зависит CONN_MAX_AGE)
+    os.environ['TRANSFER_SERVER_INTERFACE'] = mode
+
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tmp, 'cache'),
+        },
+        'pages': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(tmp, 'cache', 'pages'),
+        },
+    }
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+
+    import django
+    django.setup()
+    # Ответы 400/403 на повторные действия ожидаемы, в вывод они не нужны
+    logging.disable(logging.WARNING)
+
+    from django.core.management import call_command
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+
+def make_scenarios(clients, rounds):
+    """Данные и последовательности запросов: каждый пятый клиент — преподаватель.
+
+    Студент за раунд открывает кабинет и подает заявку по очередному предмету,
+    преподаватель открывает свою страницу, одобряет одну заявку и отклоняет другую.
+    """
+    from django.conf import settings
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.utils import timezone
+    from django.utils.crypto import get_random_string
+
+    from administration.enums import Status
+    from administration.models import Faculty, Student, Subject, SubjectGroup, Teacher, TransferRequest
+
+    n_teachers = max(1, clients // 5)
+    n_students = clients - n_teachers
+    deadline = timezone.now() + timedelta(days=7)
+
+    faculty = Faculty.objects.create(name='Benchmark')
+    subjects = Subject.objects.bulk_create([
+        Subject(name=f'Subject {i}', course=1, faculty=faculty) for i in range(rounds)
+    ])
+    students = Student.objects.bulk_create([
+        Student(full_name=f'Student {i}', year=1, sex='M', birthdate=date(2000, 1, 1), email=f's{i}@bench.ru')
+        for i in range(n_students)
+    ])
+    # Студенты, чьи заявки ждут решения преподавателей: по две на преподавателя в каждом предмете
+    waiting_students = Student.objects.bulk_create([
+        Student(full_name=f'Waiting {i}', year=1, sex='M', birthdate=date(2000, 1, 1), email=f'w{i}@bench.ru')
+        for i in range(2 * n_teachers)
+    ])
+    teachers = Teacher.objects.bulk_create([
+        Teacher(full_name=f'Teacher {i}', email=f't{i}@bench.ru') for i in range(n_teachers)
+    ])
+
+    # В каждом предмете общая исходная группа и GROUPS_PER_SUBJECT групп, преподаватель t ведет группу t % GROUPS_PER_SUBJECT
+    capacity = 10 * (n_students + len(waiting_students))
+    from_groups = SubjectGroup.objects.bulk_create([
+        SubjectGroup(subject=subject, min_students=0, max_students=capacity, deadline=deadline)
+        for subject in subjects
+    ])
+    teacher_groups = SubjectGroup.objects.bulk_create([
+        SubjectGroup(subject=subject, min_students=0, max_students=capacity, deadline=deadline)
+        for subject in subjects for _i in range(GROUPS_PER_SUBJECT)
+    ])
+    SubjectGroup.teachers.through.objects.bulk_create([
+        SubjectGroup.teachers.through(
+            subjectgroup_id=teacher_groups[r * GROUPS_PER_SUBJECT + t % GROUPS_PER_SUBJECT].pk,
+            teacher_id=teacher.pk
+        )
+        for r in range(rounds) for t, teacher in enumerate(teachers)
+    ])
+    SubjectGroup.students.through.objects.bulk_create([
+        SubjectGroup.students.through(subjectgroup_id=group.pk, student_id=student.pk)
+        for group in from_groups for student in students + waiting_students
+    ])
+    SubjectGroup.recount_students()
+
+    # bulk_create не вызывает save(), поэтому коды заявок задаются явно
+    waiting = TransferRequest.objects.bulk_create([
+        TransferRequest(
+            code=f'BENCH-{(r * n_teachers + t) * 2 + k:06d}',
+            student=waiting_students[2 * t + k], subject=subject, from_group=from_groups[r],
+            to_group=teacher_groups[r * GROUPS_PER_SUBJECT + t % GROUPS_PER_SUBJECT], status=Status.WAITING_TEACHER, reason='bench'
+        )
+        for r, subject in enumerate(subjects) for t in range(n_teachers) for k in range(2)
+    ])
+
+    csrf = get_random_string(32)
+
+    def cookie(key, pk):
+        session = SessionStore()
+        session[key] = pk
+        session.create()
+        return f'{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}'
+
+    scenarios = []
+    for i, student in enumerate(students):
+        requests = []
+        for r, subject in enumerate(subjects):
+            group = teacher_groups[r * GROUPS_PER_SUBJECT + i % GROUPS_PER_SUBJECT]
+            requests.append(('GET', '/cabinet/', {}))
+            requests.append(('POST', f'/transfer/create/{subject.pk}/', {'reason': 'bench', 'new_group': group.pk}))
+        scenarios.append((cookie('student_pk', student.pk), requests))
+
+    for t, teacher in enumerate(teachers):
+        requests = []
+        for r in range(rounds):
+            approve, reject = waiting[2 * (r * n_teachers + t)], waiting[2 * (r * n_teachers + t) + 1]
+            requests.append(('GET', '/teacher/', {}))
+            requests.append(('POST', f'/transfer/approve/{approve.pk}/', {'comment': 'ok'}))
+            requests.append(('POST', f'/transfer/reject/{reject.pk}/', {'comment': 'bench'}))
+        scenarios.append((cookie('teacher_pk', teacher.pk), requests))
+
+    return scenarios, csrf
+
+
+def run_wsgi(scenarios, csrf, wsgi_threads):
+    from transfer.wsgi import application
+
+    # Потоки сервера живут весь прогон и держат свои соединения с базой (CONN_MAX_AGE)
+    server = ThreadPoolExecutor(max_workers=wsgi_threads)
+    barrier = threading.Barrier(len(scenarios))
+
+    def call(method, path, cookie, body):
+        statuses = []
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'testserver',
+            'HTTP_COOKIE': cookie,
+            'HTTP_X_CSRFTOKEN': csrf,
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return int(statuses[0].split()[0])
+
+    def client(scenario):
+        cookie, requests = scenario
+        results = []
+        barrier.wait()
+        for method, path, data in requests:
+            started = time.perf_counter()
+            # Поток сервера занят запросом целиком, включая ожидание базы
+            status = server.submit(call, method, path, cookie, urlencode(data).encode()).result()
+            results.append((time.perf_counter() - started, status))
+        return results
+
+    started = time.perf_counter()
+    with server, ThreadPoolExecutor(max_workers=len(scenarios)) as clients:
+        results = [result for results in clients.map(client, scenarios) for result in results]
+    return results, time.perf_counter() - started
+
+
+def run_asgi(scenarios, csrf):
+    from transfer.asgi import application
+
+    async def call(method, path, cookie, body):
+        status = None
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'query_string': b'',
+            'root_path': '',
+            'server': ('testserver', 80),
+            'client': ('127.0.0.1', 0),
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', cookie.encode()),
+                (b'x-csrftoken', csrf.encode()),
+                (b'content-type', b'application/x-www-form-urlencoded'),
+                (b'content-length', str(len(body)).encode()),
+            ],
+        }
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+            # Клиент не отключается, пока ответ не получен
+            await asyncio.Future()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        await application(scope, receive, send)
+        return status
+
+    async def client(scenario, start):
+        cookie, requests = scenario
+        results = []
+        await start.wait()
+        for method, path, data in requests:
+            started = time.perf_counter()
+            status = await call(method, path, cookie, urlencode(data).encode())
+            results.append((time.perf_counter() - started, status))
+        return results
+
+    async def main():
+        start = asyncio.Event()
+        tasks = [asyncio.create_task(client(scenario, start)) for scenario in scenarios]
+        await asyncio.sleep(0)
+        started = time.perf_counter()
+        start.set()
+        results = await asyncio.gather(*tasks)
+        return [result for results in results for result in results], time.perf_counter() - started
+
+    return asyncio.run(main())
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run_mode(mode, clients, rounds, wsgi_threads):
+    with tempfile.TemporaryDirectory() as tmp:
+        setup(tmp, mode)
+
+        from django.db import connection
+
+        from administration.enums import Status
+        from administration.models import TransferRequest
+
+        scenarios, csrf = make_scenarios(clients, rounds)
+        connection.close()
+
+        if mode == 'wsgi':
+            results, elapsed = run_wsgi(scenarios, csrf, wsgi_threads)
+        else:
+            results, elapsed = run_asgi(scenarios, csrf)
+
+        latencies = sorted(latency for latency, _status in results)
+        return {
+            'mode': mode,
+            'requests': len(results),
+            'errors': sum(1 for _latency, status in results if status not in (200, 302)),
+            'seconds': elapsed,
+            'rps': len(results) / elapsed,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': latencies[-1] * 1000,
+            'created': TransferRequest.objects.filter(reason='bench', status=Status.WAITING_TEACHER).count(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=5, help='раундов на клиента (по разным предметам)')
+    parser.add_argument('--wsgi-threads', type=int, default=32, help='потоков WSGI-сервера')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.clients, args.rounds, args.wsgi_threads)))
+        return
+
+    print(f'Клиентов: {args.clients}, раундов: {args.rounds}, потоков WSGI: {args.wsgi_threads}')
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--clients', str(args.clients),
+             '--rounds', str(args.rounds), '--wsgi-threads', str(args.wsgi_threads)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f'{result["mode"]}: {result["requests"]} запросов за {result["seconds"]:.2f} с, '
+            f'{result["rps"]:.0f} запросов/с, ошибок: {result["errors"]}, заявок подано: {result["created"]}, '
+            f'p50 {result["p50"]:.1f} мс, p95 {result["p95"]:.1f} мс, '
+            f'p99 {result["p99"]:.1f} мс, max {result["max"]:.1f} мс'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache, caches
+from django.utils.translation import get_language
+
+from administration.cache_versions import ALL, get_versions, version_key
+
+# Сколько живет страница в кэше, если ее версии так и не изменились
+PAGE_TIMEOUT = 24 * 60 * 60
+
+# Счетчики попаданий и промахов копятся в процессе и раз в STATS_FLUSH_EVERY обращений
+# добавляются к общим в кэше. Статистика приблизительная: incr файлового кэша не атомарен,
+# а не сброшенные счетчики завершившегося процесса теряются
+STATS_KEYS = {
+    'hits': 'portal:page:hits',
+    'misses': 'portal:page:misses',
+}
+STATS_FLUSH_EVERY = 100
+
+_stats = dict.fromkeys(STATS_KEYS, 0)
+_stats_lock = threading.Lock()
+
+
+def pages_cache():
+    return caches['pages']
+
+
+def count(name):
+    with _stats_lock:
+        _stats[name] += 1
+        if sum(_stats.values()) < STATS_FLUSH_EVERY:
+            return
+        counts = dict(_stats)
+        _stats.update(dict.fromkeys(STATS_KEYS, 0))
+
+    for name, value in counts.items():
+        if not value:
+            continue
+        key = STATS_KEYS[name]
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            if not cache.add(key, value, None):
+                cache.incr(key, value)
+
+
+def get_stats():
+    values = cache.get_many(STATS_KEYS.values())
+    with _stats_lock:
+        stats = {name: values.get(key, 0) + _stats[name] for name, key in STATS_KEYS.items()}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(dict.fromkeys(STATS_KEYS, 0))
+    cache.delete_many(STATS_KEYS.values())
+
+
+# Отрисованная страница пользователя портала. В ключе версии пользователя и общая, в записи — версии
+# предметов и групп, из которых она собрана. Версии читаются до запросов к базе: изменение во время
+# сборки страницы не даст сохранить устаревший HTML
+class PageCache:
+    def __init__(self, kind, pk, name='html'):
+        # name различает представления одного пользователя: HTML-страницу и ее JSON-состояние
+        keys = [version_key(*ALL), version_key(kind, pk)]
+        versions = get_versions(keys)
+        self.key = f'portal:page:{kind}:{pk}:{name}:{get_language()}:' + ':'.join(versions[key] for key in keys)
+        self.depends = {}
+
+    def get(self):
+        entry = pages_cache().get(self.key)
+        if entry is not None and get_versions(list(entry['depends'])) == entry['depends']:
+            count('hits')
+            return entry['content']
+
+        count('misses')
+        return None
+
+    def depend(self, kind, pks):
+        self.depends.update(get_versions([version_key(kind, pk) for pk in pks]))
+
+    def set(self, content):
+        pages_cache().set(self.key, {'depends': self.depends, 'content': content}, PAGE_TIMEOUT)
+
+    # Асинхронные варианты для представлений под ASGI: файловый кэш читается в потоке
+    @classmethod
+    async def acreate(cls, kind, pk, name='html'):
+        return await sync_to_async(cls)(kind, pk, name)
+
+    async def aget(self):
+        return await sync_to_async(self.get)()
+
+    async def adepend(self, kind, pks):
+        await sync_to_async(self.depend)(kind, pks)
+
+    async def aset(self, content):
+        await sync_to_async(self.set)(content)
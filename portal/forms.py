@@ -1,35 +1,57 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db.models import CharField, Value
 from django.utils.translation import gettext_lazy as _
 
 from administration.models import Student, Teacher
 
+# Порядок проверки, если e-mail есть у обоих: раньше студент искался первым
+IDENTITY_MODELS = {
+    'student': Student,
+    'teacher': Teacher,
+}
+
+
+def find_identity(email):
+    # (модель, pk) пользователя по e-mail одним запросом (UNION по уникальным индексам email) или None.
+    # Отдельной таблицы соответствий нет: импорт и правка студентов и преподавателей ее не синхронизируют
+    queries = [
+        model.objects
+        .filter(email=email)
+        .annotate(kind=Value(kind, output_field=CharField()))
+        .order_by()
+        .values_list('kind', 'pk')
+        for kind, model in IDENTITY_MODELS.items()
+    ]
+    found = dict(queries[0].union(*queries[1:], all=True))
+
+    for kind, model in IDENTITY_MODELS.items():
+        if kind in found:
+            return model, found[kind]
+    return None
+
 
 class EmailLoginForm(forms.Form):
     email = forms.EmailField(label=_('Ваш e-mail'))
 
+    identity = None
+
     def clean_email(self):
         email = self.cleaned_data['email']
 
-        try:
-            Student.objects.get(email=email)
-            return email
-        except Student.DoesNotExist:
-            pass
+        self.identity = find_identity(email)
+        if self.identity is None:
+            raise ValidationError(
+                _('Пользователь с таким e-mail не найден.'),
+                code='user_not_found'
+            )
 
-        try:
-            Teacher.objects.get(email=email)
-            return email
-        except Teacher.DoesNotExist:
-            pass
+        return email
 
-        raise ValidationError(
-            _('Пользователь с таким e-mail не найден.'),
-            code='user_not_found'
-        )
+    def get_identity(self):
+        # (модель, pk), найденные при проверке формы, без повторного запроса
+        return self.identity
 
     def get_user(self):
-        try:
-            return Student.objects.get(email=self.cleaned_data['email'])
-        except Student.DoesNotExist:
-            return Teacher.objects.get(email=self.cleaned_data['email'])
+        model, pk = self.identity
+        return model.objects.get(pk=pk)
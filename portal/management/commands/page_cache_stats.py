@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from portal.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показать число попаданий и промахов кэша страниц кабинетов (приблизительно, см. portal/cache.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_rate"]:.1%}'
+        )
+
+        if options['reset']:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS('Счетчики обнулены'))
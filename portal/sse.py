@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+from administration.events import hub
+from administration.models import TransferEvent
+
+# Комментарий раз в столько секунд не дает прокси закрыть молчащее соединение
+KEEPALIVE = 15
+# Через сколько миллисекунд браузер переподключается после обрыва
+RETRY = 3000
+# Сколько пропущенных событий досылать после переподключения; клиент по любому событию
+# перечитывает состояние целиком, так что более старые ничего не добавят
+MISSED_LIMIT = 50
+
+
+def format_event(message):
+    data = {'request': message['request'], 'status': message['status']}
+    return f'id: {message["id"]}\nevent: status\ndata: {json.dumps(data)}\n\n'
+
+
+async def missed_events(channel, last_event_id):
+    # События, пропущенные за время переподключения (браузер присылает Last-Event-ID)
+    events = [
+        event async for event in
+        TransferEvent.objects.filter(channel=channel, pk__gt=last_event_id).order_by('-pk')[:MISSED_LIMIT]
+    ]
+    for event in reversed(events):
+        yield {'id': event.pk, 'request': event.request_id, 'status': event.status}
+
+
+async def stream(channel, last_event_id=None):
+    queue = hub.subscribe(channel)
+    try:
+        yield f'retry: {RETRY}\n\n'
+
+        sent = 0
+        if last_event_id is not None:
+            async for message in missed_events(channel, last_event_id):
+                sent = message['id']
+                yield format_event(message)
+
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+
+            if message['id'] > sent:
+                yield format_event(message)
+    finally:
+        hub.unsubscribe(channel, queue)
+
+
+def event_stream_response(request, channel):
+    # Поток Server-Sent Events канала студента или преподавателя; под ASGI ожидание событий —
+    # await на очереди, поток на соединение не нужен
+    if not settings.PORTAL_EVENTS or not isinstance(request, ASGIRequest):
+        # Под WSGI StreamingHttpResponse дочитывает асинхронный поток до конца, прежде чем
+        # что-то отправить: соединение заняло бы поток сервера навсегда. На 204 браузер
+        # прекращает переподключаться
+        return HttpResponse(status=204)
+
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    response = StreamingHttpResponse(
+        stream(channel, int(last_event_id) if last_event_id.isdigit() else None),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Не буферизовать поток в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,167 @@
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from administration.enums import Status
+from administration.models import SubjectGroup, TransferRequest
+from .cache import PageCache, pages_cache
+
+# Сколько хранится снимок состояния, от которого клиент может запросить изменения
+SNAPSHOT_TIMEOUT = 60 * 60
+
+TEACHER_NAMES_DEFAULT = '--'
+
+
+def student_state(student_pk, page):
+    # По каждому предмету студента: текущая группа, ее преподаватели, последняя заявка
+    # и число студентов во всех группах предмета
+    current = {}
+    for subject_id, group_id in (
+            SubjectGroup.objects
+            .filter(students=student_pk)
+            .order_by('pk')
+            .values_list('subject_id', 'pk')):
+        current.setdefault(subject_id, group_id)
+    page.depend('subject', list(current))
+
+    teacher_names = defaultdict(list)
+    for group_id, full_name in (
+            SubjectGroup.teachers.through.objects
+            .filter(subjectgroup_id__in=list(current.values()))
+            .order_by('teacher__full_name')
+            .values_list('subjectgroup_id', 'teacher__full_name')):
+        teacher_names[group_id].append(full_name)
+
+    requests = {}
+    for subject_id, to_group_id, status in (
+            TransferRequest.objects
+            .filter(student_id=student_pk, subject_id__in=list(current))
+            .order_by('-created_at')
+            .values_list('subject_id', 'to_group_id', 'status')):
+        requests.setdefault(subject_id, {'to_group': to_group_id, 'status': status})
+
+    groups = {
+        str(pk): {'subject': subject_id, 'students_count': students_count}
+        for pk, subject_id, students_count in (
+            SubjectGroup.objects
+            .filter(subject_id__in=list(current))
+            .values_list('pk', 'subject_id', 'students_count')
+        )
+    }
+
+    return {
+        'subjects': {
+            str(subject_id): {
+                'current_group': group_id,
+                'teacher_names': ', '.join(teacher_names[group_id]) or TEACHER_NAMES_DEFAULT,
+                'request': requests.get(subject_id),
+            }
+            for subject_id, group_id in current.items()
+        },
+        'groups': groups,
+    }
+
+
+def teacher_state(teacher_pk, page):
+    # Составы групп преподавателя, выполненные переводы из них и в них, заявки, ждущие его решения
+    group_ids = dict(SubjectGroup.objects.filter(teachers=teacher_pk).values_list('pk', 'subject_id'))
+    page.depend('group', list(group_ids))
+    page.depend('subject', set(group_ids.values()))
+
+    groups = {pk: {'students': [], 'transferred_from': [], 'transferred_to': []} for pk in group_ids}
+
+    for group_id, full_name in (
+            SubjectGroup.students.through.objects
+            .filter(subjectgroup_id__in=list(group_ids))
+            .order_by('student__full_name')
+            .values_list('subjectgroup_id', 'student__full_name')):
+        groups[group_id]['students'].append(full_name)
+
+    for from_group_id, to_group_id, full_name in (
+            TransferRequest.objects
+            .filter(Q(from_group_id__in=list(group_ids)) | Q(to_group_id__in=list(group_ids)),
+                    status=Status.COMPLETED)
+            .order_by('-created_at')
+            .values_list('from_group_id', 'to_group_id', 'student__full_name')):
+        if from_group_id in groups:
+            groups[from_group_id]['transferred_from'].append(full_name)
+        if to_group_id in groups:
+            groups[to_group_id]['transferred_to'].append(full_name)
+
+    waiting = (
+        TransferRequest.objects
+        .filter(status=Status.WAITING_TEACHER, to_group_id__in=list(group_ids))
+        .select_related('student', 'subject', 'from_group__subject', 'to_group__subject')
+        .prefetch_related('from_group__teachers', 'to_group__teachers')
+    )
+
+    return {
+        'groups': {str(pk): group for pk, group in groups.items()},
+        'requests': {
+            str(req.pk): {
+                'created_at': req.created_at.isoformat(),
+                'subject': req.subject.name,
+                'student': req.student.full_name,
+                'from_group': str(req.from_group),
+                'to_group': str(req.to_group),
+            }
+            for req in waiting
+        },
+    }
+
+
+STATES = {
+    'student': student_state,
+    'teacher': teacher_state,
+}
+
+
+def make_etag(state):
+    return hashlib.sha1(json.dumps(state, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def snapshot_key(kind, pk, etag):
+    return f'portal:state:{kind}:{pk}:{etag}'
+
+
+def diff_state(old, new):
+    # Изменения по разделам: новые и измененные записи целиком, удаленные — списком ключей
+    changes = {}
+    removed = {}
+    for section, entries in new.items():
+        before = old.get(section, {})
+        changes[section] = {key: value for key, value in entries.items() if before.get(key) != value}
+        removed[section] = [key for key in before if key not in entries]
+    return changes, removed
+
+
+def state_response(request, kind, pk):
+    # JSON-состояние кабинета с сильным ETag, кэшируется с теми же версиями, что и HTML, и хранится
+    # снимком по ETag. На If-None-Match с текущим ETag — 304, с ?since=<ETag> — только изменения
+    page = PageCache(kind, pk, 'state')
+    entry = page.get()
+    if entry is None:
+        state = STATES[kind](pk, page)
+        entry = {'etag': make_etag(state), 'state': state}
+        page.set(entry)
+        pages_cache().set(snapshot_key(kind, pk, entry['etag']), state, SNAPSHOT_TIMEOUT)
+
+    etag = f'"{entry["etag"]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        since = request.GET.get('since')
+        old = pages_cache().get(snapshot_key(kind, pk, since)) if since else None
+
+        if old is None:
+            response = JsonResponse({'version': entry['etag'], 'full': True, **entry['state']})
+        else:
+            changes, removed = diff_state(old, entry['state'])
+            response = JsonResponse({'version': entry['etag'], 'full': False, **changes, 'removed': removed})
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
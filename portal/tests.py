@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from administration.enums import Status
+from administration.models import Faculty, Student, Subject, SubjectGroup, Teacher, TransferRequest
+
+# Сессия, студент, предметы, группы предметов, их преподаватели, последние заявки
+CABINET_QUERIES = 6
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+})
+class CabinetViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.faculty = Faculty.objects.create(name='ФПМИ')
+        cls.student = Student.objects.create(
+            full_name='Студент', year=1, sex='M', birthdate=date(2000, 1, 1), email='student@phystech.edu'
+        )
+        cls.teacher_number = 0
+
+    def setUp(self):
+        for alias in ('default', 'pages'):
+            caches[alias].clear()
+        session = self.client.session
+        session['student_pk'] = self.student.pk
+        session.save()
+
+    def add_subject(self, groups):
+        # Студент в первой группе предмета, в остальные у него по заявке
+        subject = Subject.objects.create(name=f'Предмет {Subject.objects.count()}', course=1, faculty=self.faculty)
+        subject_groups = []
+        for i in range(groups):
+            group = SubjectGroup.objects.create(
+                subject=subject, min_students=1, max_students=30, deadline=timezone.now() + timedelta(days=1)
+            )
+            for _ in range(2):
+                self.teacher_number += 1
+                group.teachers.add(Teacher.objects.create(
+                    full_name=f'Преподаватель {self.teacher_number}', email=f't{self.teacher_number}@phystech.edu'
+                ))
+            subject_groups.append(group)
+
+        subject_groups[0].students.add(self.student)
+        for group in subject_groups[1:]:
+            TransferRequest.objects.create(
+                student=self.student, subject=subject, from_group=subject_groups[0], to_group=group,
+                reason='Причина', status=Status.REJECTED
+            )
+
+    def assert_cabinet_queries(self, subjects):
+        with self.assertNumQueries(CABINET_QUERIES):
+            response = self.client.get(reverse('portal:cabinet'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['data']), subjects)
+
+    def test_one_subject(self):
+        self.add_subject(groups=2)
+        self.assert_cabinet_queries(subjects=1)
+
+    def test_many_subjects_and_groups(self):
+        for _ in range(10):
+            self.add_subject(groups=6)
+        self.assert_cabinet_queries(subjects=10)
+
+    def test_cached_page(self):
+        self.add_subject(groups=2)
+        self.client.get(reverse('portal:cabinet'))
+
+        # Из кэша страница отдается без запросов, кроме чтения сессии
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('portal:cabinet'))
+        self.assertEqual(response.status_code, 200)
@@ -8,6 +8,10 @@ urlpatterns = [
     path('', views.login_view, name='login'),
     path('cabinet/', views.cabinet_view, name='cabinet'),
     path('teacher/', views.teacher_view, name='teacher'),
+    path('cabinet/state/', views.cabinet_state_view, name='cabinet_state'),
+    path('teacher/state/', views.teacher_state_view, name='teacher_state'),
+    path('cabinet/events/', views.cabinet_events_view, name='cabinet_events'),
+    path('teacher/events/', views.teacher_events_view, name='teacher_events'),
     path('transfer/create/<int:subject_pk>/', views.transfer_view, name='transfer'),
     path('transfer/approve/<int:pk>/', views.approve_transfer, name='approve_transfer'),
     path('transfer/reject/<int:pk>/', views.reject_transfer, name='reject_transfer'),
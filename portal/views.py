@@ -1,13 +1,21 @@
-from django.db.models import Prefetch
-from django.http import JsonResponse
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect
 from django.shortcuts import render
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.http import require_http_methods
 
 from administration.enums import Status
+from administration.events import student_channel, teacher_channel
 from administration.models import Student, SubjectGroup, Subject, TransferRequest, Teacher, evaluate_conditions
+from .cache import PageCache
 from .forms import EmailLoginForm
+from .sse import event_stream_response
+from .state import state_response
 
 
 def login_view(request):
@@ -15,13 +23,14 @@ def login_view(request):
         form = EmailLoginForm(request.POST)
 
         if form.is_valid():
-            user = form.get_user()
+            # Сессии нужен только pk: экземпляр пользователя не загружается
+            model, pk = form.get_identity()
 
-            if isinstance(user, Student):
-                request.session['student_pk'] = user.pk
+            if model is Student:
+                request.session['student_pk'] = pk
                 return redirect('portal:cabinet')
-            elif isinstance(user, Teacher):
-                request.session['teacher_pk'] = user.pk
+            elif model is Teacher:
+                request.session['teacher_pk'] = pk
                 return redirect('portal:teacher')
 
     else:
@@ -30,103 +39,150 @@ def login_view(request):
     return render(request, 'portal/login.html', {'form': form})
 
 
-def cabinet_view(request):
-    student_pk = request.session.get('student_pk')
+async def cabinet_view(request):
+    # Ожидание базы не занимает поток ASGI-сервера: запросы идут через асинхронный ORM
+    student_pk = await request.session.aget('student_pk')
     if not student_pk:
         return redirect('portal:login')
 
+    # CSRF-токен страница берет из cookie, поэтому HTML можно отдавать из кэша.
+    # Кэш на диске и шаблон синхронны: они выполняются в потоке, а не в цикле событий
+    page = await PageCache.acreate('student', student_pk)
+    content = await page.aget()
+    if content is not None:
+        return HttpResponse(content)
+
     try:
-        student = Student.objects.get(pk=student_pk)
+        student = await Student.objects.aget(pk=student_pk)
     except Student.DoesNotExist:
-        request.session.pop('student_pk', None)
+        await request.session.apop('student_pk', None)
         return redirect('portal:login')
 
-    subjects = (
+    subjects = [
+        subj async for subj in
         Subject.objects
         .filter(subject_groups__students=student)
         .distinct()
+    ]
+    await page.adepend('subject', [subj.pk for subj in subjects])
+
+    # Все группы предметов студента одним запросом: признак членства
+    # считается в базе, преподаватели подгружаются пачкой
+    groups = (
+        SubjectGroup.objects
+        .filter(subject__in=subjects)
+        .annotate(
+            is_current=Exists(
+                SubjectGroup.students.through.objects.filter(
+                    subjectgroup_id=OuterRef('pk'),
+                    student_id=student.pk
+                )
+            )
+        )
+        .prefetch_related('teachers')
+        .order_by('pk')
     )
 
-    data = []
+    groups_by_subject = defaultdict(list)
+    current_groups = {}
+    async for grp in groups:
+        groups_by_subject[grp.subject_id].append(grp)
+        if grp.is_current:
+            current_groups.setdefault(grp.subject_id, grp)
 
-    for subj in subjects:
-        current_group = (
-            SubjectGroup.objects
-            .filter(subject=subj, students=student)
-            .prefetch_related('teachers')
-            .first()
-        )
+    # Последняя заявка по каждому предмету за один проход
+    transfer_requests = {}
+    async for req in (
+        TransferRequest.objects
+        .filter(student=student, subject__in=subjects)
+        .order_by('-created_at')
+    ):
+        transfer_requests.setdefault(req.subject_id, req)
 
-        all_groups = (
-            SubjectGroup.objects
-            .filter(subject=subj)
-            .prefetch_related('teachers', 'students')
-        )
+    data = []
 
-        transfer_request = (
-            TransferRequest.objects
-            .filter(student=student, subject=subj)
-            .order_by('-created_at')
-            .first()
-        )
+    for subj in subjects:
+        current_group = current_groups.get(subj.pk)
 
         data.append({
             'subject': subj,
             'current_group': current_group,
             'teacher_names': current_group.get_teacher_names(),
-            'all_groups': all_groups,
-            'transfer_request': transfer_request
+            'all_groups': groups_by_subject[subj.pk],
+            'transfer_request': transfer_requests.get(subj.pk)
         })
 
-    return render(request, 'portal/cabinet.html', {
+    response = await sync_to_async(render)(request, 'portal/cabinet.html', {
         'student': student,
         'data': data,
+        'events': settings.PORTAL_EVENTS,
     })
+    await page.aset(response.content)
+    return response
 
 
-def teacher_view(request):
-    teacher_pk = request.session.get('teacher_pk')
+async def teacher_view(request):
+    teacher_pk = await request.session.aget('teacher_pk')
     if not teacher_pk:
         return redirect('portal:login')
 
+    page = await PageCache.acreate('teacher', teacher_pk)
+    content = await page.aget()
+    if content is not None:
+        return HttpResponse(content)
+
     try:
-        teacher = Teacher.objects.get(pk=teacher_pk)
+        teacher = await Teacher.objects.aget(pk=teacher_pk)
     except Teacher.DoesNotExist:
-        request.session.pop('teacher_pk', None)
+        await request.session.apop('teacher_pk', None)
         return redirect('portal:login')
 
-    transfer_requests = (
+    # Версии групп читаются до загрузки их составов и заявок
+    groups = [row async for row in SubjectGroup.objects.filter(teachers=teacher).values_list('pk', 'subject_id')]
+    await page.adepend('group', [pk for pk, _subject_id in groups])
+    await page.adepend('subject', {subject_id for _pk, subject_id in groups})
+
+    # Все, что читает шаблон (включая преподавателей в названиях групп), загружается заранее
+    transfer_requests = [
+        req async for req in
         TransferRequest.objects
         .filter(status=Status.WAITING_TEACHER,
                 to_group__teachers=teacher)
-        .select_related('student', 'subject', 'from_group', 'to_group')
-    )
+        .select_related('student', 'subject', 'from_group__subject', 'to_group__subject')
+        .prefetch_related('from_group__teachers', 'to_group__teachers')
+    ]
 
     completed = TransferRequest.objects.filter(
         status=Status.COMPLETED
     ).select_related('student')
 
-    subject_groups = (
+    subject_groups = [
+        grp async for grp in
         SubjectGroup.objects
         .filter(teachers=teacher)
         .select_related('subject')
         .prefetch_related(
+            'teachers',
             'students',  # текущие
             Prefetch('outgoing_requests', queryset=completed, to_attr='transferred_from'),
             Prefetch('incoming_requests', queryset=completed, to_attr='transferred_to'),
         )
-    )
+    ]
 
     context = {
         'teacher': teacher,
         'subject_groups': subject_groups,
         'transfer_requests': transfer_requests,
+        'events': settings.PORTAL_EVENTS,
     }
-    return render(request, 'portal/teacher.html', context)
+    response = await sync_to_async(render)(request, 'portal/teacher.html', context)
+    await page.aset(response.content)
+    return response
 
 
-@require_http_methods(['POST'])
-def transfer_view(request, subject_pk):
+@require_http_methods(['GET'])
+def cabinet_state_view(request):
+    # Статусы заявок и численность групп для обновления кабинета без перезагрузки
     student_pk = request.session.get('student_pk')
     if not student_pk:
         return JsonResponse({
@@ -134,17 +190,66 @@ def transfer_view(request, subject_pk):
             'message': _('Пожалуйста, сначала войдите в систему.')
         }, status=403)
 
+    return state_response(request, 'student', student_pk)
+
+
+@require_http_methods(['GET'])
+def teacher_state_view(request):
+    teacher_pk = request.session.get('teacher_pk')
+    if not teacher_pk:
+        return JsonResponse({
+            'status': 'error',
+            'message': _('Пожалуйста, сначала войдите в систему как преподаватель.')
+        }, status=403)
+
+    return state_response(request, 'teacher', teacher_pk)
+
+
+@require_http_methods(['GET'])
+async def cabinet_events_view(request):
+    # Поток смен статусов заявок студента; обслуживается ASGI-приложением без отдельного потока
+    student_pk = await request.session.aget('student_pk')
+    if not student_pk:
+        return JsonResponse({
+            'status': 'error',
+            'message': _('Пожалуйста, сначала войдите в систему.')
+        }, status=403)
+
+    return event_stream_response(request, student_channel(student_pk))
+
+
+@require_http_methods(['GET'])
+async def teacher_events_view(request):
+    teacher_pk = await request.session.aget('teacher_pk')
+    if not teacher_pk:
+        return JsonResponse({
+            'status': 'error',
+            'message': _('Пожалуйста, сначала войдите в систему как преподаватель.')
+        }, status=403)
+
+    return event_stream_response(request, teacher_channel(teacher_pk))
+
+
+@require_http_methods(['POST'])
+async def transfer_view(request, subject_pk):
+    student_pk = await request.session.aget('student_pk')
+    if not student_pk:
+        return JsonResponse({
+            'status': 'error',
+            'message': _('Пожалуйста, сначала войдите в систему.')
+        }, status=403)
+
     try:
-        student = Student.objects.get(pk=student_pk)
+        student = await Student.objects.aget(pk=student_pk)
     except Student.DoesNotExist:
-        request.session.pop('student_pk', None)
+        await request.session.apop('student_pk', None)
         return JsonResponse({
             'status': 'error',
             'message': _('Студент не найден. Выполните вход заново.')
         }, status=403)
 
     try:
-        subject = Subject.objects.get(pk=subject_pk)
+        subject = await Subject.objects.aget(pk=subject_pk)
     except Subject.DoesNotExist:
         return JsonResponse({
             'status': 'error',
@@ -152,7 +257,7 @@ def transfer_view(request, subject_pk):
         }, status=404)
 
     existing = TransferRequest.objects.filter(student=student, subject=subject)
-    if existing.exists():
+    if await existing.aexists():
         return JsonResponse({
             'status': 'pending',
             'message': _('Заявка уже находится в обработке.')
@@ -175,17 +280,17 @@ def transfer_view(request, subject_pk):
     new_group_pk = int(new_group_str)
 
     try:
-        to_group = SubjectGroup.objects.get(pk=new_group_pk, subject=subject)
+        to_group = await SubjectGroup.objects.aget(pk=new_group_pk, subject=subject)
     except SubjectGroup.DoesNotExist:
         return JsonResponse({
             'status': 'error',
             'message': _('Выбранной группы не существует или она не относится к этому предмету.')
         }, status=404)
 
-    from_group = (
+    from_group = await (
         SubjectGroup.objects
         .filter(subject=subject, students=student)
-        .first()
+        .afirst()
     )
 
     if from_group and from_group.pk == to_group.pk:
@@ -210,7 +315,7 @@ def transfer_view(request, subject_pk):
             'message': _('Ваша заявка на перевод отправлена.')
         })
 
-    TransferRequest.objects.create(
+    await TransferRequest.objects.acreate(
         student=student,
         subject=subject,
         from_group=from_group,
@@ -222,8 +327,8 @@ def transfer_view(request, subject_pk):
     return response
 
 
-def approve_or_reject(request, pk):
-    teacher_pk = request.session.get('teacher_pk')
+async def approve_or_reject(request, pk):
+    teacher_pk = await request.session.aget('teacher_pk')
     if not teacher_pk:
         return JsonResponse({
             'status': 'error',
@@ -231,16 +336,16 @@ def approve_or_reject(request, pk):
         }, status=403)
 
     try:
-        teacher = Teacher.objects.get(pk=teacher_pk)
+        teacher = await Teacher.objects.aget(pk=teacher_pk)
     except Teacher.DoesNotExist:
-        request.session.pop('teacher_pk', None)
+        await request.session.apop('teacher_pk', None)
         return JsonResponse({
             'status': 'error',
             'message': _('Преподаватель не найден. Выполните вход заново.')
         }, status=403)
 
     try:
-        req = TransferRequest.objects.get(pk=pk)
+        req = await TransferRequest.objects.aget(pk=pk)
     except TransferRequest.DoesNotExist:
         return JsonResponse({
             'status': 'error',
@@ -253,7 +358,7 @@ def approve_or_reject(request, pk):
             'message': _('Заявка не ожидает действия от преподавателя.')
         }, status=403)
 
-    if not req.to_group.teachers.filter(pk=teacher.pk).exists():
+    if not await SubjectGroup.objects.filter(pk=req.to_group_id, teachers=teacher).aexists():
         return JsonResponse({
             'status': 'error',
             'message': _('У вас нет прав на действия для этой заявки.')
@@ -264,8 +369,8 @@ def approve_or_reject(request, pk):
 
 
 @require_http_methods(['POST'])
-def approve_transfer(request, pk):
-    data = approve_or_reject(request, pk)
+async def approve_transfer(request, pk):
+    data = await approve_or_reject(request, pk)
     if isinstance(data, JsonResponse):
         return data
 
@@ -275,7 +380,7 @@ def approve_transfer(request, pk):
     req.comment_teacher = comment
 
     req.status = Status.WAITING_ADMIN
-    req.save()
+    await req.asave()
 
     return JsonResponse({
         'status': 'success',
@@ -284,8 +389,8 @@ def approve_transfer(request, pk):
 
 
 @require_http_methods(['POST'])
-def reject_transfer(request, pk):
-    data = approve_or_reject(request, pk)
+async def reject_transfer(request, pk):
+    data = await approve_or_reject(request, pk)
     if isinstance(data, JsonResponse):
         return data
 
@@ -302,7 +407,7 @@ def reject_transfer(request, pk):
     req.comment_teacher = prefix + f'«{comment}»'
 
     req.status = Status.REJECTED
-    req.save()
+    await req.asave()
 
     return JsonResponse({
         'status': 'success',
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'transfer.settings')
+# Включает то, что работает только под ASGI (поток событий SSE в кабинетах), и отключает
+# постоянные соединения с базой, см. transfer/settings.py
+# Запуск: uvicorn transfer.asgi:application --workers 4 (uvicorn в requirements.txt)
+os.environ.setdefault('TRANSFER_SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
@@ -71,6 +71,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'transfer.wsgi.application'
 
+# Интерфейс сервера приложений: 'wsgi' (gunicorn, runserver) или 'asgi' (uvicorn, см. transfer/asgi.py)
+SERVER_INTERFACE = os.environ.get('TRANSFER_SERVER_INTERFACE', 'wsgi')
+
+# Поток событий SSE держит соединение открытым: без ASGI он навсегда занял бы поток сервера
+PORTAL_EVENTS = SERVER_INTERFACE == 'asgi'
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -78,9 +84,57 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Под WSGI соединение живет между запросами, PRAGMA из transfer/sqlite.py выполняются один раз
+        # на соединение. Под ASGI синхронная часть каждого запроса идет в новом потоке, постоянное
+        # соединение не переиспользуется, а остается открытым до сборки мусора, поэтому там соединение
+        # (и PRAGMA) на каждый запрос. Переопределяется переменной окружения TRANSFER_CONN_MAX_AGE
+        'CONN_MAX_AGE': int(os.environ.get('TRANSFER_CONN_MAX_AGE', 0 if SERVER_INTERFACE == 'asgi' else 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Транзакции сразу берут блокировку на запись: вместо "database is locked" при попытке
+            # повысить читающую транзакцию до пишущей они ждут своей очереди
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# PRAGMA для каждого нового соединения SQLite, выполняются в transfer/sqlite.py. Профиль для
+# одновременной подачи заявок: WAL — чтение не блокирует запись и наоборот, writer ждет блокировку
+# busy_timeout мс, а не падает сразу; synchronous=NORMAL в режиме WAL не теряет целостность,
+# fsync делается только на checkpoint
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'foreign_keys': 'ON',
+    'temp_store': 'MEMORY',
+    'cache_size': -20000,
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Shared by all worker processes: Settings.load() keeps its version stamp here
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Страницы кабинетов и снимки их состояния: по записи на пользователя и язык, поэтому
+    # отдельно от версий в default, чтобы вытеснение страниц не сбрасывало версии
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'pages',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -122,7 +176,16 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 
+# Uploaded files (import jobs keep their ODS files here)
+
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Import of ODS registry files
+# Files are streamed in chunks; 'pandas' cleans each chunk column-wise, 'python' cleans it row by row without loading pandas
+
+ODS_IMPORT_ENGINE = 'pandas'
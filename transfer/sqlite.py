@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+# Подключается к connection_created в AdministrationConfig.ready(); профиль — SQLITE_PRAGMAS в settings.py
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')